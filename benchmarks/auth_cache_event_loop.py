@@ -0,0 +1,93 @@
+"""
+Event-loop latency of the current-user cache under concurrent authenticated load.
+
+Simulates N concurrent requests that each perform the cache round trips done by
+Auth.get_current_user (GET, then SET with TTL on a miss) while a probe task measures
+how late the event loop wakes it up. Compares a blocking redis.Redis client with the
+pooled redis.asyncio client used by the application.
+
+Usage (needs a running redis, see docker-compose.yml):
+    python -m benchmarks.auth_cache_event_loop --requests 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import pickle
+import statistics
+import time
+
+import redis
+import redis.asyncio as aredis
+
+from src.conf.config import config
+
+
+PAYLOAD = pickle.dumps({"id": 1, "email": "bench@example.com", "username": "bench", "avatar": "x" * 120})
+
+
+async def probe(stop: asyncio.Event, lags: list[float], interval: float = 0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(request, total: int, concurrency: int):
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await request(f"bench:user:{i % concurrency}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return elapsed, lags
+
+
+def report(name: str, elapsed: float, lags: list[float], total: int):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[int(len(lags_ms) * 0.99) - 1] if len(lags_ms) > 1 else lags_ms[0]
+    print(f"{name:>6}: {total / elapsed:9.0f} req/s | loop lag median {statistics.median(lags_ms):7.2f} ms "
+          f"p99 {p99:7.2f} ms max {lags_ms[-1]:7.2f} ms")
+
+
+async def main(total: int, concurrency: int):
+    sync_client = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, password=config.REDIS_PASSWORD)
+    # Same pool as the application: with more concurrent requests than connections, requests wait for one.
+    pool = aredis.BlockingConnectionPool(host=config.REDIS_DOMAIN, port=config.REDIS_PORT,
+                                         password=config.REDIS_PASSWORD, max_connections=config.REDIS_POOL_SIZE,
+                                         timeout=config.REDIS_POOL_TIMEOUT)
+    async_client = aredis.Redis(connection_pool=pool)
+
+    async def sync_request(key: str):
+        if sync_client.get(key) is None:
+            sync_client.set(key, PAYLOAD)
+            sync_client.expire(key, 300)
+
+    async def async_request(key: str):
+        if await async_client.get(key) is None:
+            await async_client.set(key, PAYLOAD, ex=300)
+
+    keys = [f"bench:user:{i}" for i in range(concurrency)]
+    sync_client.delete(*keys)
+    report("sync", *await run(sync_request, total, concurrency), total)
+    sync_client.delete(*keys)
+    report("async", *await run(async_request, total, concurrency), total)
+    sync_client.delete(*keys)
+
+    await async_client.close()
+    await pool.disconnect()
+    sync_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,94 @@
+"""
+First-request latency after a cold start, with minimal and full pool prewarming.
+
+Starts `uvicorn main:app` --runs times with DB_POOL_PREWARM/REDIS_POOL_PREWARM set to 1 (the minimum:
+the reachability check keeps its connection) and to --prewarm, waits until the port accepts connections
+(the lifespan startup is done by then) and sends two bursts of --concurrency concurrent requests to --path,
+as a worker gets when it joins the load balancer. Without a warm pool the first burst waits for new
+database and redis connections. Pass an access token with --token to time an authenticated endpoint such
+as /api/contacts/: log in beforehand, the token stays valid across restarts, so the timed requests are the
+first ones the worker serves.
+
+Usage (needs the database and redis from the config):
+    python -m benchmarks.cold_start --runs 5 --prewarm 10 --concurrency 10
+    python -m benchmarks.cold_start --path /api/contacts/ --token eyJhbGciOi...
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port: int, process: asyncio.subprocess.Process, timeout: float = 60) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.returncode is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return time.perf_counter() - start
+        except OSError:
+            await asyncio.sleep(0.005)
+    raise TimeoutError("server did not start")
+
+
+async def burst(client: httpx.AsyncClient, path: str, concurrency: int) -> list[float]:
+    async def timed():
+        start = time.perf_counter()
+        (await client.get(path)).raise_for_status()
+        return time.perf_counter() - start
+    return await asyncio.gather(*(timed() for _ in range(concurrency)))
+
+
+async def cold_start(prewarm: int, path: str, token: str | None, concurrency: int) -> tuple[float, float, float]:
+    port = free_port()
+    env = {**os.environ, "DB_POOL_PREWARM": str(prewarm), "REDIS_POOL_PREWARM": str(prewarm)}
+    process = await asyncio.create_subprocess_exec(sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                                   "--log-level", "warning", env=env)
+    try:
+        ready = await wait_for_port(port, process)
+        headers = {"user-agent": "cold-start-benchmark"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=headers, limits=limits) as client:
+            # Opens the HTTP connections without touching the pools.
+            await asyncio.gather(*(client.get("/docs") for _ in range(concurrency)))
+            first = await burst(client, path, concurrency)
+            second = await burst(client, path, concurrency)
+        return ready, max(first), max(second)
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+async def main(runs: int, prewarm: int, path: str, token: str | None, concurrency: int):
+    for warm in (1, prewarm):
+        results = [await cold_start(warm, path, token, concurrency) for _ in range(runs)]
+        ready, first, second = (statistics.median(values) * 1000 for values in zip(*results))
+        print(f"prewarm={warm:3d} | startup {ready:8.1f} ms | slowest of the first {concurrency} requests "
+              f"{first:7.2f} ms | of the next {concurrency} {second:7.2f} ms (medians of {runs})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prewarm", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--path", default="/api/healthchecker")
+    parser.add_argument("--token")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.prewarm, args.path, args.token, args.concurrency))
@@ -0,0 +1,55 @@
+"""
+Latency of autocomplete lookups in the in-memory prefix index of one user.
+
+Builds a PrefixIndex over --contacts generated contacts, then replays typeahead sessions
+(every prefix of a random name or email, one lookup per keystroke) and prints the build
+time and p50/p99 lookup latency. The HTTP and auth overhead of the endpoint comes on top.
+
+Usage:
+    python -m benchmarks.contacts_autocomplete --contacts 50000 --sessions 2000
+"""
+import argparse
+import random
+import time
+
+from src.services.autocomplete import PrefixIndex
+
+FIRST_NAMES = ["Olena", "Andrii", "Iryna", "Taras", "Sofiia", "Dmytro", "Kateryna", "Oleksandr", "Mariia", "Yurii",
+               "John", "Johanna", "Wade", "Peter", "Natalia", "Bohdan", "Anastasiia", "Maksym", "Viktoriia", "Serhii"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Melnyk", "Wilson",
+              "Parker", "Johnson", "Moroz", "Lysenko", "Marchenko", "Savchenko", "Rudenko", "Petrenko"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def main(contacts: int, sessions: int, limit: int):
+    rows = []
+    for i in range(contacts):
+        first_name, last_name = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+        rows.append((i, first_name, last_name, f"{first_name.lower()}.{last_name.lower()}{i}@example.com"))
+
+    start = time.perf_counter()
+    index = PrefixIndex(rows)
+    print(f"build: {(time.perf_counter() - start) * 1000:8.2f} ms for {len(index)} terms")
+
+    latencies = []
+    for _ in range(sessions):
+        _, first_name, last_name, email = random.choice(rows)
+        text = random.choice([first_name, last_name, f"{first_name} {last_name}", email])
+        for end in range(1, len(text) + 1):
+            start = time.perf_counter()
+            index.search(text[:end], limit)
+            latencies.append(time.perf_counter() - start)
+    print(f"{len(latencies)} lookups | p50 {percentile(latencies, 0.5):8.4f} ms p99 {percentile(latencies, 0.99):8.4f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=50_000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    main(args.contacts, args.sessions, args.limit)
@@ -0,0 +1,94 @@
+"""
+Latency of the upcoming-birthdays query: EXTRACT(month/day) scan vs the indexed birthday key.
+
+Seeds --rows contacts with random birth dates for a throw-away user and times the previous
+EXTRACT-based filter against get_contacts_bd, which scans the (user_id, birthday_key) index.
+The seeded user and its contacts are deleted at the end.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.contacts_birthdays --rows 1000000 --period 7
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import between, delete, extract, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User, birthday_key
+from src.repository import contacts as repository_contacts
+
+
+async def seed(session, user_id: int, rows: int, batch: int = 10000):
+    tag = uuid.uuid4().hex[:8]
+    for start in range(0, rows, batch):
+        values = []
+        for i in range(start, min(start + batch, rows)):
+            birth_date = date(1950, 1, 1) + timedelta(days=random.randrange(365 * 60))
+            values.append({"first_name": "bench", "last_name": "bench", "email": f"{tag}-{i}@bench.example",
+                           "phone_number": "0", "additional_data": "", "user_id": user_id,
+                           "birth_date": birth_date, "birthday_key": birthday_key(birth_date)})
+        await session.execute(insert(Contact), values)
+        await session.commit()
+
+
+async def legacy_query(session, user_id: int, period: int, limit: int):
+    today = date.today()
+    end = today + timedelta(days=period)
+    condition = between(extract('month', Contact.birth_date), today.month, end.month) & \
+                between(extract('day', Contact.birth_date), today.day, end.day)
+    stmt = select(Contact).filter_by(user_id=user_id).filter(condition).limit(limit)
+    return (await session.execute(stmt)).scalars().all()
+
+
+async def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def main(db_url: str, rows: int, period: int, limit: int, repeat: int):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-")
+        session.add(user)
+        await session.commit()
+        try:
+            print(f"seeding {rows} contacts ...")
+            await seed(session, user.id, rows)
+
+            async def legacy():
+                await legacy_query(session, user.id, period, limit)
+                session.expunge_all()
+
+            async def indexed():
+                await repository_contacts.get_contacts_bd(period, limit, 0, session, user)
+                session.expunge_all()
+
+            print(f" extract: {await measure(legacy, repeat):8.2f} ms (median)")
+            print(f" indexed: {await measure(indexed, repeat):8.2f} ms (median)")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--period", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.rows, args.period, args.limit, args.repeat))
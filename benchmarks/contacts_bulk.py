@@ -0,0 +1,62 @@
+"""
+Import throughput of POST /api/contacts/ (one request per contact) vs POST /api/contacts/bulk.
+
+Creates --single contacts one request at a time and --rows contacts in one streamed NDJSON
+request on a running server, and prints rows per second for both. The contacts get unique
+throw-away emails; delete them afterwards if the database is shared.
+
+Usage (needs a running server and a confirmed user):
+    python -m benchmarks.contacts_bulk --url http://localhost:8000 \\
+        --email deadpool@example.com --password 123456789 --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+
+def contact(tag: str, i: int) -> dict:
+    return {"first_name": f"bulk{i}", "last_name": "bench", "email": f"{tag}-{i}@bench.example",
+            "phone_number": f"{i:010d}", "birth_date": "1990-03-01", "additional_data": ""}
+
+
+async def ndjson(tag: str, rows: int, batch: int = 1000):
+    for start in range(0, rows, batch):
+        yield "".join(json.dumps(contact(tag, i)) + "\n" for i in range(start, min(start + batch, rows))).encode()
+
+
+async def main(url: str, email: str, password: str, rows: int, single: int):
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        response = await client.post("/api/auth/login", data={"username": email, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        tag = uuid.uuid4().hex[:8]
+
+        start = time.perf_counter()
+        for i in range(single):
+            (await client.post("/api/contacts/", json=contact(f"{tag}-single", i), headers=headers)).raise_for_status()
+        elapsed = time.perf_counter() - start
+        print(f"  single: {single:6d} rows in {elapsed:7.2f} s | {single / elapsed:8.0f} rows/s")
+
+        start = time.perf_counter()
+        response = await client.post("/api/contacts/bulk", content=ndjson(f"{tag}-bulk", rows),
+                                     headers={**headers, "Content-Type": "application/x-ndjson"})
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        print(f"    bulk: {rows:6d} rows in {elapsed:7.2f} s | {rows / elapsed:8.0f} rows/s")
+        print("    statuses:", dict(Counter(row["status"] for row in response.json()["rows"])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--single", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.email, args.password, args.rows, args.single))
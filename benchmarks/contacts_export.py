@@ -0,0 +1,78 @@
+"""
+Time to first byte, throughput and peak memory of the streaming contact export.
+
+Seeds --rows contacts for a throw-away user and runs the export generator of
+GET /api/contacts/export for every format, discarding the output. Peak memory is traced
+with tracemalloc and should not grow with --rows. The seeded user and its contacts are
+deleted at the end.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.contacts_export --rows 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User, birthday_key
+from src.repository import contacts as repository_contacts
+from src.services.export import EXPORT_FORMATS, export_chunks
+
+
+async def seed(session, user_id: int, rows: int, batch: int = 10000):
+    tag = uuid.uuid4().hex[:8]
+    for start in range(0, rows, batch):
+        values = []
+        for i in range(start, min(start + batch, rows)):
+            birth_date = date(1950, 1, 1) + timedelta(days=i % 20000)
+            values.append({"first_name": f"name{i}", "last_name": "bench", "email": f"{tag}-{i}@bench.example",
+                           "phone_number": f"{i:010d}", "additional_data": "some notes, about the contact",
+                           "user_id": user_id, "birth_date": birth_date, "birthday_key": birthday_key(birth_date)})
+        await session.execute(insert(Contact), values)
+        await session.commit()
+
+
+async def main(db_url: str, rows: int):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-")
+        session.add(user)
+        await session.commit()
+        try:
+            print(f"seeding {rows} contacts ...")
+            await seed(session, user.id, rows)
+
+            print(f"{'format':>8} {'first byte ms':>14} {'total s':>8} {'MB':>8} {'peak MB':>8}")
+            for fmt in EXPORT_FORMATS:
+                async with session_maker() as export_session:
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    first_byte, size = None, 0
+                    async for chunk in export_chunks(repository_contacts.stream_contacts(export_session, user), fmt):
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        size += len(chunk)
+                    total = time.perf_counter() - start
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                print(f"{fmt:>8} {first_byte * 1000:>14.2f} {total:>8.2f} {size / 2 ** 20:>8.1f} {peak / 2 ** 20:>8.1f}")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.rows))
@@ -0,0 +1,96 @@
+"""
+CPU time and response size of a 500-contact page: ORM objects + ContactResponse vs the lean page.
+
+Seeds --rows contacts for a throw-away user, then builds the JSON body of one page --repeat
+times both ways: get_contacts_by_criteria (contacts joined with their owner) serialized
+through ContactResponse like the response_model of GET /api/contacts/, and
+get_contact_rows_by_criteria serialized by contact_page_adapter like GET /api/contacts/page.
+The seeded user and its contacts are deleted at the end.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.contacts_lean_page --rows 500 --limit 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import date
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas.contact import ContactResponse, contact_page_adapter
+
+
+async def seed(session, user_id: int, rows: int):
+    tag = uuid.uuid4().hex[:8]
+    values = [{"first_name": f"name{i}", "last_name": "bench", "email": f"{tag}-{i}@bench.example",
+               "phone_number": f"{i:010d}", "additional_data": "some notes", "birth_date": date(1990, 3, 1),
+               "birthday_key": 301, "user_id": user_id} for i in range(rows)]
+    await session.execute(insert(Contact), values)
+    await session.commit()
+
+
+async def measure(func, repeat: int) -> tuple[float, float, int]:
+    wall, cpu = [], []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        body = await func()
+        wall.append((time.perf_counter() - wall_start) * 1000)
+        cpu.append((time.process_time() - cpu_start) * 1000)
+    return statistics.median(wall), statistics.median(cpu), len(body)
+
+
+async def main(db_url: str, rows: int, limit: int, repeat: int):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    response_adapter = TypeAdapter(list[ContactResponse])
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-",
+                    avatar="https://example.com/avatar.png")
+        session.add(user)
+        await session.commit()
+        try:
+            await seed(session, user.id, rows)
+
+            async def orm_page():
+                contacts, _ = await repository_contacts.get_contacts_by_criteria({}, limit, 0, session, user)
+                body = response_adapter.dump_json([ContactResponse.model_validate(c) for c in contacts])
+                session.expunge_all()
+                session.add(user)
+                return body
+
+            async def lean_page():
+                contact_rows, next_cursor = await repository_contacts.get_contact_rows_by_criteria({}, limit, 0, session,
+                                                                                                   user)
+                return contact_page_adapter.dump_json({
+                    "user": {"id": user.id, "username": user.username, "email": user.email, "avatar": user.avatar,
+                             "role": user.role},
+                    "contacts": [row._asdict() for row in contact_rows],
+                    "next_cursor": next_cursor,
+                })
+
+            print(f"{'':>6} {'wall ms':>8} {'cpu ms':>8} {'bytes':>9}")
+            for name, func in (("orm", orm_page), ("lean", lean_page)):
+                wall, cpu, size = await measure(func, repeat)
+                print(f"{name:>6} {wall:>8.2f} {cpu:>8.2f} {size:>9}")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.rows, args.limit, args.repeat))
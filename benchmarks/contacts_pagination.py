@@ -0,0 +1,85 @@
+"""
+Per-page latency of OFFSET and cursor (keyset) pagination of contacts.
+
+Seeds --rows contacts for a throw-away user, then reads pages at increasing depths with
+get_contacts_by_criteria in offset mode and in cursor mode. Offset latency grows with the
+page number, cursor latency should stay flat. The seeded user and its contacts are deleted
+at the end.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.contacts_pagination --rows 1000000 --limit 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User
+from src.repository import contacts as repository_contacts
+
+
+async def seed(session, user_id: int, rows: int, batch: int = 10000):
+    tag = uuid.uuid4().hex[:8]
+    for start in range(0, rows, batch):
+        values = [{"first_name": f"name{i % 5000:04d}", "last_name": "bench", "email": f"{tag}-{i}@bench.example",
+                   "phone_number": "0", "additional_data": "", "user_id": user_id}
+                  for i in range(start, min(start + batch, rows))]
+        await session.execute(insert(Contact), values)
+        await session.commit()
+
+
+async def timed(coro) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def main(db_url: str, rows: int, limit: int, sort: str):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-")
+        session.add(user)
+        await session.commit()
+        try:
+            print(f"seeding {rows} contacts ...")
+            await seed(session, user.id, rows)
+
+            depths = [d for d in (0, 10, 100, 1000, 5000, rows // limit - 1) if d * limit < rows]
+            cursors = {0: None}
+            # Walk the cursor chain once to find the cursor of each measured page.
+            page, cursor = 0, None
+            while page < depths[-1]:
+                _, cursor = await repository_contacts.get_contacts_by_criteria({}, limit, 0, session, user, cursor, sort)
+                page += 1
+                if page in depths:
+                    cursors[page] = cursor
+                session.expunge_all()
+
+            print(f"{'page':>8} {'offset ms':>10} {'cursor ms':>10}")
+            for depth in depths:
+                offset_ms, _ = await timed(repository_contacts.get_contacts_by_criteria(
+                    {}, limit, depth * limit, session, user, None, sort))
+                cursor_ms, _ = await timed(repository_contacts.get_contacts_by_criteria(
+                    {}, limit, 0, session, user, cursors[depth], sort))
+                session.expunge_all()
+                print(f"{depth:>8} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--sort", choices=list(repository_contacts.SORT_KEYS), default="id")
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.rows, args.limit, args.sort))
@@ -0,0 +1,101 @@
+"""
+Latency of the contact search: a plain ILIKE scan vs search_contacts on the trigram index.
+
+Seeds --rows contacts with generated names, emails and phone numbers for a throw-away user and
+times a set of queries (name prefixes, a misspelt name, email and phone fragments) through an
+unindexed ILIKE over the columns and through search_contacts. The seeded user and its contacts
+are deleted at the end.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.contacts_search --rows 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User
+from src.repository import contacts as repository_contacts
+
+FIRST_NAMES = ["Olena", "Andrii", "Iryna", "Taras", "Sofiia", "Dmytro", "Kateryna", "Oleksandr", "Mariia", "Yurii",
+               "John", "Johanna", "Wade", "Peter", "Natalia", "Bohdan", "Anastasiia", "Maksym", "Viktoriia", "Serhii"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Melnyk", "Wilson",
+              "Parker", "Johnson", "Moroz", "Lysenko", "Marchenko", "Savchenko", "Rudenko", "Petrenko"]
+QUERIES = ["Ole", "kovalen", "Shevcehnko", "johnson", "@bench.exa", "5012", "+38067"]
+
+
+async def seed(session, user_id: int, rows: int, batch: int = 10000):
+    tag = uuid.uuid4().hex[:8]
+    for start in range(0, rows, batch):
+        values = []
+        for i in range(start, min(start + batch, rows)):
+            first_name, last_name = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+            values.append({"first_name": first_name, "last_name": last_name,
+                           "email": f"{first_name.lower()}.{last_name.lower()}.{tag}{i}@bench.example",
+                           "phone_number": f"+380{random.choice('5679')}{random.randrange(10 ** 8):08d}",
+                           "additional_data": "", "user_id": user_id})
+        await session.execute(insert(Contact), values)
+        await session.commit()
+
+
+async def ilike_query(session, user_id: int, q: str, limit: int):
+    pattern = f"%{q}%"
+    stmt = select(Contact).filter_by(user_id=user_id).filter(
+        or_(Contact.first_name.ilike(pattern), Contact.last_name.ilike(pattern),
+            Contact.email.ilike(pattern), Contact.phone_number.ilike(pattern))).limit(limit)
+    return (await session.execute(stmt)).scalars().all()
+
+
+async def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def main(db_url: str, rows: int, limit: int, repeat: int):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-")
+        session.add(user)
+        await session.commit()
+        try:
+            print(f"seeding {rows} contacts ...")
+            await seed(session, user.id, rows)
+
+            print(f"{'query':>12} {'ilike ms':>10} {'search ms':>10} {'hits':>5}")
+            for q in QUERIES:
+                async def ilike():
+                    await ilike_query(session, user.id, q, limit)
+                    session.expunge_all()
+
+                async def search():
+                    await repository_contacts.search_contacts(q, limit, session, user)
+                    session.expunge_all()
+
+                hits = len(await repository_contacts.search_contacts(q, limit, session, user))
+                print(f"{q:>12} {await measure(ilike, repeat):>10.2f} {await measure(search, repeat):>10.2f} {hits:>5}")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.rows, args.limit, args.repeat))
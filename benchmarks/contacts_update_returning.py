@@ -0,0 +1,91 @@
+"""
+Round trips and latency of updating a contact: SELECT + UPDATE + COMMIT + refresh vs UPDATE ... RETURNING.
+
+Creates a throw-away user with one contact and updates it --repeat times the way
+update_contact used to (select with the joined owner, assign, commit, refresh) and with
+the current update_contact, counting the statements sent to the database with an engine
+event. The user stays attached to the session, as on a user cache miss, so update_contact
+loads the owner again after its commit; with a cached (detached) user it is a single statement.
+The seeded user and contact are deleted at the end.
+
+Usage (needs a migrated database and redis, DB_URL from the config by default):
+    python -m benchmarks.contacts_update_returning --repeat 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.database.cache import redis_manager
+from src.entity.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas.contact import ContactModel
+
+
+async def legacy_update(session, contact_id: int, body: ContactModel, user: User):
+    contact = (await session.execute(select(Contact).filter_by(id=contact_id, user_id=user.id))).scalar_one_or_none()
+    for name, value in body.model_dump().items():
+        setattr(contact, name, value)
+    await session.commit()
+    await session.refresh(contact)
+    return contact
+
+
+async def measure(func, repeat: int, statements: list) -> tuple[float, float]:
+    timings = []
+    statements.clear()
+    for i in range(repeat):
+        start = time.perf_counter()
+        await func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(statements) / repeat
+
+
+async def main(db_url: str, repeat: int):
+    redis_manager.init()
+    engine = create_async_engine(db_url)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    session_maker = async_sessionmaker(engine, expire_on_commit=True)
+    async with session_maker() as session:
+        tag = uuid.uuid4().hex[:8]
+        user = User(username="bench", email=f"bench-{tag}@bench.example", password="-")
+        contact = Contact(first_name="bench", last_name="bench", email=f"{tag}@bench.example", phone_number="0",
+                          additional_data="", user=user)
+        session.add(contact)
+        await session.flush()
+        user_id, contact_id = user.id, contact.id
+        await session.commit()
+        # Stays attached to the session, as the user loaded by get_current_user on a user cache miss:
+        # every commit expires it.
+        user = await session.get(User, user_id)
+        try:
+            def body(i: int) -> ContactModel:
+                return ContactModel(first_name=f"bench{i}", last_name="bench", email=f"{tag}@bench.example",
+                                    phone_number=str(i), additional_data="")
+
+            legacy_ms, legacy_statements = await measure(
+                lambda i: legacy_update(session, contact_id, body(i), user), repeat, statements)
+            returning_ms, returning_statements = await measure(
+                lambda i: repository_contacts.update_contact(contact_id, body(i), session, user), repeat, statements)
+            print(f"   select+update+refresh: {legacy_ms:7.3f} ms (median) {legacy_statements:4.1f} statements")
+            print(f"      update ... returning: {returning_ms:7.3f} ms (median) {returning_statements:4.1f} statements")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user_id))
+            await session.execute(delete(User).where(User.id == user_id))
+            await session.commit()
+    await engine.dispose()
+    await redis_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.repeat))
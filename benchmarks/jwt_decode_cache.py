@@ -0,0 +1,37 @@
+"""
+Throughput of access-token decoding with and without the verified-JWT cache.
+
+Decodes the same access token repeatedly, as happens when a client reuses it for every
+request during its lifetime, once with jose's jwt.decode and once through Auth.decode_token.
+
+Usage:
+    python -m benchmarks.jwt_decode_cache --number 20000
+"""
+import argparse
+import asyncio
+import timeit
+
+from jose import jwt
+
+from src.services.auth import auth_service
+
+
+def main(number: int):
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "bench@example.com"}))
+
+    def uncached():
+        jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+
+    def cached():
+        auth_service.decode_token(token)
+
+    for name, func in (("uncached", uncached), ("cached", cached)):
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:>8}: {number / seconds:12.0f} decodes/s | {seconds / number * 1e6:8.2f} us/decode")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.number)
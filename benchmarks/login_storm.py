@@ -0,0 +1,72 @@
+"""
+Contacts-endpoint latency during a login storm.
+
+Samples GET /api/contacts/ latency on a running server, first on an idle server and then
+while a burst of concurrent logins (bcrypt verification) is in flight, and prints p50/p99
+for both phases. With bcrypt in the password hashing executor the two p99 values should
+stay close; excess logins beyond PASSWORD_HASH_MAX_PENDING are answered with 503.
+
+Usage (needs a running server and a confirmed user):
+    python -m benchmarks.login_storm --url http://localhost:8000 \\
+        --email deadpool@example.com --password 123456789 --logins 200
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def sample_contacts(client: httpx.AsyncClient, token: str, stop: asyncio.Event, latencies: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/contacts/", headers={"Authorization": f"Bearer {token}"})
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> httpx.Response:
+    return await client.post("/api/auth/login", data={"username": email, "password": password})
+
+
+async def main(url: str, email: str, password: str, logins: int, idle: float):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        response = await login(client, email, password)
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        idle_latencies: list[float] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_contacts(client, token, stop, idle_latencies))
+        await asyncio.sleep(idle)
+        stop.set()
+        await sampler
+
+        storm_latencies: list[float] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_contacts(client, token, stop, storm_latencies))
+        responses = await asyncio.gather(*(login(client, email, password) for _ in range(logins)))
+        stop.set()
+        await sampler
+
+    for name, latencies in (("idle", idle_latencies), ("storm", storm_latencies)):
+        print(f"{name:>5}: {len(latencies):5d} requests | p50 {percentile(latencies, 0.5):8.2f} ms "
+              f"p99 {percentile(latencies, 0.99):8.2f} ms")
+    print("login status codes:", dict(Counter(r.status_code for r in responses)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to sample before the storm")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.email, args.password, args.logins, args.idle))
@@ -0,0 +1,112 @@
+"""
+Python-side CPU per call of the hot lookups: statements rebuilt on every call, lambda statements
+and the statements built once with bound parameters that the repository uses.
+
+get_contact_by_id and get_user_by_email used to build select(...).filter_by(...) on every call, so
+SQLAlchemy had to construct the statement and walk it to compute its cache key before it could find
+the compiled SQL in its cache. A statement built once memoizes its cache key; a call only binds the
+values. lambda_stmt is listed for comparison: it skips building the statement, but for ORM statements
+it clones the whole statement on every execution to substitute the values.
+Measures, --repeat times each, the whole lookup against the database (CPU of this process, so the
+driver and the ORM are included). Seeds a throw-away user with one contact and deletes them at the end.
+--profile prints the top functions of every variant.
+
+Usage (needs a migrated database, DB_URL from the config by default):
+    python -m benchmarks.statement_cache --repeat 20000 --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+import uuid
+
+from sqlalchemy import delete, lambda_stmt, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
+
+
+async def rebuilt_contact_by_id(contact_id, db, user):
+    stmt = select(Contact).filter_by(id=contact_id, user_id=user.id)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def lambda_contact_by_id(contact_id, db, user):
+    user_id = user.id
+    stmt = lambda_stmt(lambda: select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id))
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def rebuilt_user_by_email(email, db):
+    stmt = select(User).filter_by(email=email)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def lambda_user_by_email(email, db):
+    stmt = lambda_stmt(lambda: select(User).where(User.email == email))
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def cpu_us(func, repeat: int, profile: bool) -> float:
+    # warm the compiled and prepared statement caches
+    for _ in range(100):
+        await func()
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    start = time.process_time()
+    for _ in range(repeat):
+        await func()
+    elapsed = (time.process_time() - start) / repeat * 1e6
+    if profiler:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(12)
+    return elapsed
+
+
+async def main(db_url: str, repeat: int, profile: bool):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="bench", email=f"bench-{uuid.uuid4().hex[:8]}@bench.example", password="-")
+        session.add(user)
+        await session.flush()
+        contact = Contact(first_name="bench", last_name="bench", email=f"{uuid.uuid4().hex[:8]}@bench.example",
+                          phone_number="0", additional_data="", user_id=user.id)
+        session.add(contact)
+        await session.flush()
+        contact_id, email = contact.id, user.email
+        await session.commit()
+        try:
+            cases = (
+                ("get_contact_by_id", lambda: rebuilt_contact_by_id(contact_id, session, user),
+                 lambda: lambda_contact_by_id(contact_id, session, user),
+                 lambda: repository_contacts.get_contact_by_id(contact_id, session, user)),
+                ("get_user_by_email", lambda: rebuilt_user_by_email(email, session),
+                 lambda: lambda_user_by_email(email, session),
+                 lambda: repository_users.get_user_by_email(email, session)),
+            )
+            print(f"{'':>18} {'rebuilt us':>11} {'lambda us':>10} {'built once us':>14} {'saved':>6}")
+            for name, rebuilt, with_lambda, built_once in cases:
+                before = await cpu_us(rebuilt, repeat, profile)
+                lambda_cpu = await cpu_us(with_lambda, repeat, profile)
+                after = await cpu_us(built_once, repeat, profile)
+                print(f"{name:>18} {before:>11.1f} {lambda_cpu:>10.1f} {after:>14.1f} {1 - after / before:>6.0%}")
+        finally:
+            await session.execute(delete(Contact).where(Contact.user_id == user.id))
+            await session.execute(delete(User).where(User.id == user.id))
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=config.DB_URL)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.db_url, args.repeat, args.profile))
@@ -1,5 +1,10 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
 from ipaddress import ip_address
 import re
+import time
 from typing import Callable
 from pathlib import Path
 
@@ -10,17 +15,75 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-import redis.asyncio as redis
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio  import AsyncSession
 
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
+from src.database.cache import redis_manager
+from src.database.instrumentation import RequestStats, request_stats, logger as sql_logger
+from src.services.invalidation import invalidation_bus
+from src.services.contact_counts import contact_counter
+from src.services.passwords import password_hasher
+from src.services.auth import auth_service
+from src.services.role import RoleAccess
+from src.entity.models import Role
 from src.routes import contacts, auth, users
 from src.conf import messages
 from src.conf.config import config
 
 
-app = FastAPI()
+def configure_logging():
+    """
+    The configure_logging function sends the per-request SQL stats and the logs of the background services
+    to stderr at INFO level. A logger that already has handlers, from a logging config passed to uvicorn
+    or from an earlier startup in the same process, is left as it is, so handlers are never added twice.
+    
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    for logger in (sql_logger, logging.getLogger("src.services")):
+        if logger.handlers:
+            continue
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.INFO)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function prepares the worker before it accepts traffic and cleans up after it stops.
+    On startup it opens DB_POOL_PREWARM database and REDIS_POOL_PREWARM redis connections, so the
+    first requests find warm pools, and fails if the database or redis can not be reached within
+    STARTUP_TIMEOUT seconds. Then it starts the background tasks. On shutdown it stops them and
+    closes every pooled connection.
+    
+    :param app: FastAPI: The application
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    configure_logging()
+    try:
+        async with asyncio.timeout(config.STARTUP_TIMEOUT):
+            await asyncio.gather(redis_manager.prewarm(config.REDIS_POOL_PREWARM),
+                                 sessionmanager.prewarm(config.DB_POOL_PREWARM))
+        await FastAPILimiter.init(redis_manager.client)
+        await auth_service.load_revocations()
+        invalidation_bus.start()
+        contact_counter.start()
+        sessionmanager.start_replica_checks()
+        yield
+    finally:
+        await invalidation_bus.stop()
+        await contact_counter.stop()
+        await sessionmanager.close()
+        await redis_manager.close()
+        password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 banned_ips = [ip_address("192.168.1.1"), ip_address("192.168.1.2"), ip_address("127.0.0.1")]
 origins = ["*"]
 
@@ -31,6 +94,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paging and caching headers browser clients need to read.
+    expose_headers=["X-Total-Count", "X-Total-Count-Capped", "X-Next-Cursor", "Link", "ETag"],
 )
 
 
@@ -57,6 +122,32 @@ async def user_agent_ban_middleware(request: Request, call_next: Callable):
     return response
 
 
+@app.middleware("http")
+async def sql_stats_middleware(request: Request, call_next: Callable):
+    """
+    The sql_stats_middleware function collects the queries of every request: their number, the time spent in
+    the database and the slowest one. They go to the Server-Timing header of the response and to one log line.
+    Statements a streamed response runs after its headers are sent are not counted.
+
+    :param request: Request: The scope of the request names its route in the log
+    :param call_next: Callable: Pass the request to the next middleware in line
+    :return: The response with the Server-Timing header
+    :doc-author: Trelent
+    """
+    if not config.SQL_INSTRUMENTATION:
+        return await call_next(request)
+    stats = RequestStats(request.scope)
+    token = request_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_stats.reset(token)
+    response.headers.append("Server-Timing", stats.server_timing())
+    sql_logger.info(json.dumps(stats.summary(response.status_code, time.perf_counter() - start)))
+    return response
+
+
 # @app.middleware("http")
 # async def ban_ips(request: Request, call_next: Callable):
 #     """
@@ -85,21 +176,6 @@ app.include_router(contacts.router, prefix="/api")
 
 
 
-@app.on_event("startup")
-async def startup():
-    """
-    The startup function is called when the application starts up.
-    It can be used to initialize resources, such as database connections.
-    
-    
-    :return: A list of functions to be executed at startup
-    :doc-author: Trelent
-    """
-    r = await redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
-    await FastAPILimiter.init(r)
-
-
-
 templates = Jinja2Templates(directory=BASE_DIR / 'src' / 'templates')
 
 @app.get("/", response_class=HTMLResponse)
@@ -138,4 +214,19 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=messages.ERROR_CONNECTING_TO_DB)
-    
\ No newline at end of file
+    
+
+
+
+@app.get("/api/db_pool_stats", name="Database pool statistics", dependencies=[Depends(RoleAccess([Role.admin]))])
+async def db_pool_stats():
+    """
+    The db_pool_stats function reports the database connection pool of this worker:
+    connections checked out, idle and in overflow, checkout timeouts, how long requests
+    waited for a connection and how old the open connections are.
+    
+    :return: A dict with the pool metrics
+    :doc-author: Trelent
+    """
+    return sessionmanager.pool_stats()
+
@@ -0,0 +1,29 @@
+"""add contacts keyset indexes
+
+Revision ID: 5f1c8e2a9b3d
+Revises: 0c2d2d6dcdac
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1c8e2a9b3d'
+down_revision: Union[str, None] = '0c2d2d6dcdac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_first_name_id', 'contacts', ['user_id', 'first_name', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_email_id', 'contacts', ['user_id', 'email', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_email_id', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_first_name_id', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,32 @@
+"""add contacts birthday key
+
+Revision ID: 8d27b4c6e1f0
+Revises: 5f1c8e2a9b3d
+Create Date: 2026-10-18 13:47:05.228316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d27b4c6e1f0'
+down_revision: Union[str, None] = '5f1c8e2a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_key', sa.SmallInteger(), nullable=True))
+    op.execute(
+        "UPDATE contacts SET birthday_key = EXTRACT(MONTH FROM birth_date) * 100 + EXTRACT(DAY FROM birth_date) "
+        "WHERE birth_date IS NOT NULL"
+    )
+    op.create_index('ix_contacts_user_id_birthday_key', 'contacts', ['user_id', 'birthday_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_key', table_name='contacts')
+    op.drop_column('contacts', 'birthday_key')
@@ -0,0 +1,33 @@
+"""add contacts search index
+
+Revision ID: b3e9f14a7c52
+Revises: 8d27b4c6e1f0
+Create Date: 2026-10-18 16:05:52.914470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9f14a7c52'
+down_revision: Union[str, None] = '8d27b4c6e1f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must stay identical to src.entity.models.contact_search_document, or the planner will not use the index.
+SEARCH_DOCUMENT = (
+    "(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' "
+    "|| coalesce(phone_number, ''))"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX ix_contacts_search_trgm ON contacts USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_search_trgm', table_name='contacts')
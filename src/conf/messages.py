@@ -4,6 +4,7 @@
 
 ACCOUNT_EXIST = "Account is already exist"
 SESSION_NOT_INITIALIZED = "Session is not initialized"
+REDIS_NOT_INITIALIZED = "Redis is not initialized"
 
 SELECT_1 = "SELECT 1"
 DATABASE_IS_NOT_CONFIGURED_CORRECTLY  = "Database is not configured correctly"
@@ -12,9 +13,17 @@ WELCOME_TO_FASTAPI = "Welcome to FastAPI!"
 ERROR_CONNECTING_TO_DB = "Error connecting to the database"
 
 NOT_FOUND = "Contact not found"
+INVALID_CURSOR = "Invalid pagination cursor"
+EMAIL_REQUIRED = "Field required"
+CONTACT_OF_ANOTHER_USER = "The email belongs to a contact of another user"
+BATCH_REJECTED = "The batch with this row was rejected by the database"
+IMPORT_JOB_NOT_FOUND = "Import job not found"
+UNSUPPORTED_IMPORT_FORMAT = "Unsupported file type, upload a .csv, .vcf, .json or .ndjson file"
+FILE_TOO_LARGE = "File is too large"
 INVALID_EMAIL = "Invalid email"
 INVALID_PASSWORD = "Invalid password"
 INVALID_REFRESH_TOKEN = "Invalid refresh token"
+TOO_MANY_PASSWORD_CHECKS = "Too many logins in progress, try again later"
 
 EMAIL_NOT_CONFIRMED = "Email not confirmed"
 
@@ -0,0 +1,78 @@
+import asyncio
+
+import redis.asyncio as redis
+
+from src.conf.config import config
+from src.conf import messages
+
+
+class RedisManager:
+    def __init__(self, host: str, port: int, password: str | None, max_connections: int, timeout: float):
+        self._connection_kwargs = dict(host=host, port=port, db=0, password=password)
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._pool: redis.BlockingConnectionPool | None = None
+        self._client: redis.Redis | None = None
+
+    def init(self):
+        """
+        The init function builds the shared connection pool and the client on top of it.
+        It is called once from the application startup, so every consumer (auth cache, rate limiter)
+        borrows connections from the same bounded pool instead of opening its own. When all connections
+        are busy, a command waits up to REDIS_POOL_TIMEOUT seconds for one to be released instead of failing.
+
+        :param self: Represent the instance of the class
+        :return: The shared redis client
+        :doc-author: Trelent
+        """
+        if self._client is None:
+            self._pool = redis.BlockingConnectionPool(max_connections=self._max_connections, timeout=self._timeout,
+                                                      **self._connection_kwargs)
+            self._client = redis.Redis(connection_pool=self._pool)
+        return self._client
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            raise Exception(messages.REDIS_NOT_INITIALIZED)
+        return self._client
+
+    async def prewarm(self, connections: int):
+        """
+        The prewarm function opens up to connections pooled connections at once and pings redis,
+        so the first requests do not pay for the connection setup and an unreachable redis is noticed
+        before the worker accepts traffic.
+
+        :param self: Represent the instance of the class
+        :param connections: int: How many connections to open
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        pool = self.init().connection_pool
+        held = await asyncio.gather(*(pool.get_connection("PING") for _ in range(min(connections, self._max_connections))),
+                                    return_exceptions=True)
+        for connection in held:
+            if not isinstance(connection, BaseException):
+                await pool.release(connection)
+        for connection in held:
+            if isinstance(connection, BaseException):
+                raise connection
+        await self.client.ping()
+
+    async def close(self):
+        """
+        The close function releases every pooled connection on application shutdown.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        if self._client is not None:
+            await self._client.close()
+            await self._pool.disconnect()
+        self._client = None
+        self._pool = None
+
+
+redis_manager = RedisManager(config.REDIS_DOMAIN, config.REDIS_PORT, config.REDIS_PASSWORD, config.REDIS_POOL_SIZE,
+                             config.REDIS_POOL_TIMEOUT)
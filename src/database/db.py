@@ -1,22 +1,151 @@
+import asyncio
 import contextlib
+import itertools
+import time
 
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session
 
 from src.conf.config import config
 from src.conf import messages 
+from src.database.cache import redis_manager
+from src.database.instrumentation import instrument
+from src.database.pool import InstrumentedPool
 
+# 0 when everything received is replayed, otherwise the age of the last replayed transaction
+REPLICA_LAG_QUERY = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
 
-class DatabaseSessionManager:
+
+def engine_options(url: str) -> dict:
+    """
+    The engine_options function sizes the connection pool from the settings.
+    In-memory SQLite databases keep the single connection pool SQLAlchemy picks for them.
+
+    :param url: str: The database url
+    :return: Keyword arguments for create_async_engine
+    :doc-author: Trelent
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    options = dict(
+        poolclass=InstrumentedPool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+async def prewarm_engine(engine: AsyncEngine, connections: int):
+    """
+    The prewarm_engine function opens connections to the database at once, at most the pool size,
+    and returns them to the pool, where they wait for the first requests. It raises if the database
+    can not be reached.
+
+    :param engine: AsyncEngine: The engine to prewarm
+    :param connections: int: How many connections to open
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    if isinstance(engine.pool, InstrumentedPool):
+        connections = min(connections, engine.pool.size())
+    connections = max(connections, 1)
+    opened = 0
+    all_open = asyncio.Event()
+
+    async def hold():
+        nonlocal opened
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text(messages.SELECT_1))
+                opened += 1
+                if opened == connections:
+                    all_open.set()
+                # Held until all are open, so the pool grows instead of handing out the same connection.
+                await all_open.wait()
+        except BaseException:
+            all_open.set()
+            raise
+
+    await asyncio.gather(*(hold() for _ in range(connections)))
+
+
+def make_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(url, **engine_options(url))
+    if config.SQL_INSTRUMENTATION:
+        instrument(engine)
+    return engine
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    if isinstance(pool, InstrumentedPool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+
+class Replica:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine: AsyncEngine = make_engine(url)
+        self.session_maker = async_sessionmaker(autoflush=False, autocommit=False, bind=self.engine)
+        # Out of rotation until the first health check passes.
+        self.healthy = False
+        self.lag: float | None = None
+        self.error: str | None = None
+        self.checked_at: float | None = None
+
+    async def check(self, max_lag: float, timeout: float):
+        """
+        The check function measures the replication lag of the replica and takes it out of rotation
+        while it is down or lags behind the primary by more than max_lag seconds.
+
+        :param self: Represent the instance of the class
+        :param max_lag: float: The largest acceptable lag in seconds
+        :param timeout: float: How long to wait for the replica
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        query = REPLICA_LAG_QUERY if self.engine.dialect.name == "postgresql" else "SELECT 0"
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.engine.connect() as connection:
+                    self.lag = float((await connection.execute(text(query))).scalar_one())
+            self.error = None
+            self.healthy = self.lag <= max_lag
+        except Exception as err:
+            self.lag, self.error, self.healthy = None, f"{type(err).__name__}: {err}"[:200], False
+        self.checked_at = time.time()
+
+    def stats(self) -> dict:
+        return {"url": self.name, "healthy": self.healthy, "lag": self.lag, "error": self.error,
+                "checked_at": self.checked_at, "pool": pool_stats(self.engine)}
+
+
+class DatabaseSessionManager:
+    def __init__(self, url: str, replica_urls: list[str] = ()):
+        self._engine: AsyncEngine | None = make_engine(url)
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False, bind=self._engine)
+        self.replicas = [Replica(replica_url) for replica_url in replica_urls]
+        self._next_replica = itertools.cycle(range(len(self.replicas)))
+        self._health_task: asyncio.Task | None = None
     
     @contextlib.asynccontextmanager
-    async def session(self):
-        if self._session_maker is None:
+    async def session(self, session_maker: async_sessionmaker | None = None):
+        session_maker = session_maker or self._session_maker
+        if session_maker is None:
             raise Exception(messages.SESSION_NOT_INITIALIZED)
-        session = self._session_maker()
+        session = session_maker()
         try:
             yield session
         except Exception as err:
@@ -25,10 +154,121 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    def replica(self) -> Replica | None:
+        for _ in self.replicas:
+            replica = self.replicas[next(self._next_replica)]
+            if replica.healthy:
+                return replica
+        return None
+
+    @contextlib.asynccontextmanager
+    async def read_session(self, primary: bool = False):
+        """
+        The read_session function opens a session for read-only work on the next healthy replica, round-robin.
+        Without replicas, when none is healthy or when primary is set, the session is opened on the primary.
+
+        :param self: Represent the instance of the class
+        :param primary: bool: Read from the primary, e.g. right after a write
+        :return: An async context manager with the session
+        :doc-author: Trelent
+        """
+        async with self.session(self.pick_session_maker(read_only=True, primary=primary)) as session:
+            yield session
+
+    def pick_session_maker(self, read_only: bool = False, primary: bool = False) -> async_sessionmaker:
+        """
+        The pick_session_maker function returns the session maker of the primary, or for read-only work the one
+        of the next healthy replica. Streamed responses open their session with it directly: session() swallows
+        errors, which would end a failed stream as if it was complete.
+
+        :param self: Represent the instance of the class
+        :param read_only: bool: The session only reads, so a replica can serve it
+        :param primary: bool: Read from the primary, e.g. right after a write
+        :return: The session maker
+        :doc-author: Trelent
+        """
+        replica = self.replica() if read_only and not primary else None
+        return replica.session_maker if replica else self._session_maker
+
+    def recent_write_key(self, user_id: int) -> str:
+        return f"db:recent-write:{user_id}"
+
+    async def mark_write(self, user_id: int):
+        """
+        The mark_write function starts the read-your-writes window of a user: for DB_READ_YOUR_WRITES_WINDOW
+        seconds after a write, reads of the user go to the primary, which already has the write.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who wrote
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        if self.replicas:
+            await redis_manager.client.set(self.recent_write_key(user_id), 1, ex=config.DB_READ_YOUR_WRITES_WINDOW)
+
+    async def wrote_recently(self, user_id: int) -> bool:
+        if not self.replicas:
+            return False
+        return bool(await redis_manager.client.exists(self.recent_write_key(user_id)))
+
+    async def prewarm(self, connections: int):
+        """
+        The prewarm function fills the pool of the primary and, after a health check, the pools of the healthy
+        replicas. An unreachable primary raises; an unreachable replica just stays out of rotation.
+
+        :param self: Represent the instance of the class
+        :param connections: int: How many connections to open per engine
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        await prewarm_engine(self._engine, connections)
+        await self.check_replicas()
+        await asyncio.gather(*(prewarm_engine(replica.engine, connections) for replica in self.replicas if replica.healthy),
+                             return_exceptions=True)
+
+    async def close(self):
+        """
+        The close function closes the pooled connections of the primary and the replicas on application shutdown.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        await self.stop_replica_checks()
+        await asyncio.gather(self._engine.dispose(), *(replica.engine.dispose() for replica in self.replicas))
+
+    async def check_replicas(self):
+        await asyncio.gather(*(replica.check(config.DB_REPLICA_MAX_LAG, config.DB_REPLICA_CHECK_INTERVAL)
+                               for replica in self.replicas))
+
+    async def run_replica_checks(self):
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(config.DB_REPLICA_CHECK_INTERVAL)
+
+    def start_replica_checks(self):
+        if self.replicas and self._health_task is None:
+            self._health_task = asyncio.create_task(self.run_replica_checks())
+
+    async def stop_replica_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def pool_stats(self) -> dict:
+        stats = pool_stats(self._engine)
+        if self.replicas:
+            stats["replicas"] = [replica.stats() for replica in self.replicas]
+        return stats
+
 
-sessionmanager = DatabaseSessionManager(config.DB_URL)
+sessionmanager = DatabaseSessionManager(config.DB_URL, config.DB_REPLICA_URLS)
 
 
 async def get_db():
     async with sessionmanager.session() as session:
-        yield session
\ No newline at end of file
+        yield session
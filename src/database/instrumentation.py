@@ -0,0 +1,122 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import config
+
+logger = logging.getLogger("sql")
+
+
+class RequestStats:
+    def __init__(self, scope: dict | None = None):
+        self.scope = scope or {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: str | None = None
+        self.shapes = Counter()
+
+    @property
+    def route(self) -> str | None:
+        """
+        The route function names the endpoint by its path template, e.g. GET /api/contacts/{contact_id},
+        so log lines of the same endpoint group together. Before routing it falls back to the path.
+
+        :param self: Represent the instance of the class
+        :return: The method and the route of the request, or None outside of a request
+        :doc-author: Trelent
+        """
+        if not self.scope:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope.get('method')} {getattr(route, 'path', self.scope.get('path'))}"
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time, self.slowest_statement = elapsed, statement
+        # The statement is the shape: values are bound separately, so the same query with other values counts too.
+        self.shapes[statement] += 1
+        if self.shapes[statement] == config.SQL_REPEATED_QUERY_THRESHOLD + 1:
+            logger.warning(json.dumps({"event": "repeated_query", "route": self.route, "statement": statement,
+                                       "threshold": config.SQL_REPEATED_QUERY_THRESHOLD}))
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+                f'db-slowest;dur={self.slowest_time * 1000:.1f}')
+
+    def summary(self, status_code: int, elapsed: float) -> dict:
+        return {"event": "request", "route": self.route, "status": status_code, "duration_ms": round(elapsed * 1000, 1),
+                "queries": self.queries, "db_ms": round(self.db_time * 1000, 1),
+                "slowest_ms": round(self.slowest_time * 1000, 1), "slowest_statement": self.slowest_statement,
+                "repeated": {statement: count for statement, count in self.shapes.items()
+                             if count > config.SQL_REPEATED_QUERY_THRESHOLD} or None}
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def redact(value):
+    """
+    The redact function hides the values of statement parameters that may be personal data
+    (names, emails, phone numbers, password hashes, dates) behind their type and length.
+    Numbers, booleans and NULLs, mostly ids, limits and flags, are kept.
+
+    :param value: The parameters of a statement: a dict, a sequence or a single value
+    :return: The redacted parameters
+    :doc-author: Trelent
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= config.SQL_SLOW_QUERY_MS:
+        if executemany:
+            parameters = {"rows": len(parameters), "first": redact(parameters[0]) if parameters else None}
+        else:
+            parameters = redact(parameters)
+        logger.warning(json.dumps({"event": "slow_query", "route": stats.route if stats else None,
+                                   "duration_ms": round(elapsed * 1000, 1), "statement": statement,
+                                   "parameters": parameters}))
+
+
+def handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument(engine: AsyncEngine):
+    """
+    The instrument function times every statement the engine sends: the time is added to the stats of the
+    current request, and statements slower than SQL_SLOW_QUERY_MS are logged with redacted parameters.
+
+    :param engine: AsyncEngine: The engine to instrument
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
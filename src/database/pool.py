@@ -0,0 +1,93 @@
+import statistics
+import time
+import weakref
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    def __init__(self, samples: int = 1024):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connections_opened = 0
+        self.wait_max = 0.0
+        self.waits: deque[float] = deque(maxlen=samples)
+        self.records = weakref.WeakSet()
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.waits.append(seconds)
+        self.wait_max = max(self.wait_max, seconds)
+
+
+def summary(values: list[float], scale: float = 1.0) -> dict | None:
+    if not values:
+        return None
+    values = sorted(values)
+
+    def percentile(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))] * scale, 3)
+
+    return {"avg": round(statistics.fmean(values) * scale, 3), "p50": percentile(0.5), "p95": percentile(0.95),
+            "p99": percentile(0.99), "max": round(values[-1] * scale, 3)}
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that times every checkout (waiting for a free connection, opening a new one
+    and the pre-ping) and remembers its connections to report their age.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.record_wait(time.perf_counter() - started)
+
+    def _create_connection(self):
+        record = super()._create_connection()
+        self.metrics.connections_opened += 1
+        self.metrics.records.add(record)
+        return record
+
+    def stats(self) -> dict:
+        """
+        The stats function reports how saturated the pool is: connections checked out, idle and over the pool size,
+        checkout timeouts, the checkout wait of the last checkouts in milliseconds and the age of the open
+        connections in seconds.
+
+        :param self: Represent the instance of the class
+        :return: A dict with the pool metrics
+        :doc-author: Trelent
+        """
+        now = time.time()
+        ages = [now - record.starttime for record in list(self.metrics.records) if record.dbapi_connection is not None]
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "open": self.size() + self.overflow(),
+            "checkouts": self.metrics.checkouts,
+            "timeouts": self.metrics.timeouts,
+            "connections_opened": self.metrics.connections_opened,
+            "wait_ms": summary(list(self.metrics.waits), 1000),
+            "wait_max_ms": round(self.metrics.wait_max * 1000, 3),
+            "connection_age_s": summary(ages),
+        }
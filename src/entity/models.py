@@ -1,10 +1,26 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, func, Enum
+from datetime import date
+
+from sqlalchemy import Boolean, Column, DDL, ForeignKey, Index, Integer, SmallInteger, String, DateTime, event, func, literal_column, Enum
 from sqlalchemy.types import Date
 
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.orm import DeclarativeBase, relationship, validates
 
 import enum
 
+
+def birthday_key(birth_date: date | None) -> int | None:
+    """
+    The birthday_key function maps a birth date to its month and day as the number MMDD, e.g. 1 March -> 301.
+    Contacts store it in an indexed column, so birthdays in a period are found with a range scan.
+    
+    :param birth_date: date | None: The birth date
+    :return: The MMDD key, or None without a birth date
+    :doc-author: Trelent
+    """
+    if birth_date is None:
+        return None
+    return birth_date.month * 100 + birth_date.day
+
 class Base(DeclarativeBase):
     pass
 
@@ -17,12 +33,63 @@ class Contact(Base):
     email = Column(String(50), unique=True, index=True, nullable=False)
     phone_number = Column(String(20), default="None", nullable=False)
     birth_date = Column(Date, nullable=True)
+    birthday_key = Column(SmallInteger, nullable=True)
     additional_data = Column(String, default="None", nullable=False)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), nullable=True, default=1)
     user = relationship("User", backref='contacts', lazy='joined')
 
+    __table_args__ = (
+        # keyset pagination: WHERE user_id = :uid AND (key, id) > (:key, :id) ORDER BY key, id
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_first_name_id", "user_id", "first_name", "id"),
+        Index("ix_contacts_user_id_email_id", "user_id", "email", "id"),
+        Index("ix_contacts_user_id_birthday_key", "user_id", "birthday_key"),
+    )
+
+    @validates("birth_date")
+    def _set_birthday_key(self, key, value):
+        self.birthday_key = birthday_key(value)
+        return value
+
+
+def contact_search_document():
+    """
+    The contact_search_document function builds the text searched by /api/contacts/search.
+    Only immutable operators are used, so Postgres can index the expression with pg_trgm
+    (see the add contacts search index migration); it must stay identical to the indexed expression.
+    
+    :return: A SQL expression concatenating names, email and phone number
+    :doc-author: Trelent
+    """
+    # Literal constants rather than bound parameters, otherwise the planner can not match the index expression.
+    empty, space = literal_column("''"), literal_column("' '")
+    return (func.coalesce(Contact.first_name, empty).concat(space).concat(func.coalesce(Contact.last_name, empty))
+            .concat(space).concat(func.coalesce(Contact.email, empty))
+            .concat(space).concat(func.coalesce(Contact.phone_number, empty)))
+
+
+# SQLite has no pg_trgm: keep an external-content FTS5 table with the trigram tokenizer in sync instead.
+CONTACTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, phone_number, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number); END",
+]
+for statement in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Contact.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
+
 
 class Role(enum.Enum):
     admin: str = "admin"
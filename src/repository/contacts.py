@@ -1,31 +1,183 @@
-from sqlalchemy import select, extract, between
+import base64
+import calendar
+import json
+from collections import Counter
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import Boolean, bindparam, delete, update, select, tuple_, or_, case, func, literal, literal_column, table, column, Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import raiseload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.asyncio  import AsyncSession
 from datetime import datetime, timedelta, date
 
-from src.entity.models import Contact, User
-from src.schemas.contact import ContactModel
+from src.database.db import sessionmanager
+from src.entity.models import Contact, User, birthday_key, contact_search_document
+from src.services.auth import Principal
+from src.services.autocomplete import autocomplete_index
+from src.services.contact_counts import contact_counter
+from src.services.etags import contact_versions
+from src.conf import messages
+from src.schemas.contact import ContactModel, ContactUpdateModel
+from src.services.json_stream import JSONStreamError
+
+
+# Sort keys available for keyset pagination. Only non-nullable columns can be compared as row values.
+SORT_KEYS = {"id": Contact.id, "first_name": Contact.first_name, "email": Contact.email}
+
+# Columns of the lean read path, see get_contact_rows_by_criteria.
+CONTACT_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone_number,
+                   Contact.birth_date, Contact.additional_data, Contact.created_at, Contact.updated_at)
+
+# Columns overwritten when an upserted email already exists.
+UPSERT_COLUMNS = ("first_name", "last_name", "phone_number", "birth_date", "birthday_key", "additional_data")
+
+# Hot lookups, built once with bound parameters: SQLAlchemy memoizes their cache key, so a call only binds
+# the values. (lambda_stmt would re-clone an ORM statement on every execution to substitute the values.)
+CONTACT_BY_ID = select(Contact).where(Contact.id == bindparam("contact_id"), Contact.user_id == bindparam("user_id"))
+CONTACT_VERSIONS = (
+    select(Contact.updated_at, User.updated_at)
+    .join(User, Contact.user_id == User.id)
+    .where(Contact.id == bindparam("contact_id"), Contact.user_id == bindparam("user_id"))
+)
+
+
+def encode_cursor(sort: str, contact: Contact) -> str:
+    """
+    The encode_cursor function builds the opaque cursor that points right after the given contact.
+    
+    :param sort: str: The sort key of the listing
+    :param contact: Contact: The last contact of the current page
+    :return: A url-safe cursor string
+    :doc-author: Trelent
+    """
+    raw = json.dumps([sort, getattr(contact, sort), contact.id], separators=(",", ":"),
+                     default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """
+    The decode_cursor function unpacks a cursor made by encode_cursor.
+    It raises ValueError for malformed cursors, for cursors of another sort key and for values
+    that do not fit the type of the sort column, so a tampered cursor never reaches the database.
+    
+    :param cursor: str: The cursor from the request
+    :param sort: str: The sort key of the listing
+    :return: The sort key value and the id of the last contact of the previous page
+    :doc-author: Trelent
+    """
+    try:
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as err:
+        raise ValueError("Malformed cursor") from err
+    if cursor_sort != sort or type(last_id) is not int:
+        raise ValueError("Cursor does not match the sort key")
+    return cursor_value(SORT_KEYS[sort].type.python_type, value), last_id
+
 
+def cursor_value(python_type: type, value):
+    # JSON has no dates: they are encoded as ISO strings. bool is an int subclass, but not a valid key.
+    if python_type in (date, datetime) and isinstance(value, str):
+        return python_type.fromisoformat(value)
+    if type(value) is not python_type:
+        raise ValueError("Cursor value does not match the sort key")
+    return value
 
 
+def paginate(stmt: Select, limit: int, offset: int, cursor: str | None, sort: str) -> Select:
+    """
+    The paginate function orders a contacts query by the sort key and applies the page window.
+    With a cursor the window is an index-backed (key, id) > (:key, :id) predicate, so every page costs the same;
+    without one it falls back to OFFSET for compatibility with older clients.
+    One row more than limit is fetched: split_page uses it to tell whether a next page exists.
+    
+    :param stmt: Select: The query to paginate
+    :param limit: int: The page size
+    :param offset: int: The number of rows to skip when no cursor is given
+    :param cursor: str | None: The cursor returned with the previous page
+    :param sort: str: The sort key, one of SORT_KEYS
+    :return: The paginated query
+    :doc-author: Trelent
+    """
+    column = SORT_KEYS[sort]
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            stmt = stmt.where(Contact.id > last_id)
+        else:
+            stmt = stmt.where(tuple_(column, Contact.id) > tuple_(value, last_id))
+    else:
+        stmt = stmt.offset(offset)
+    if sort == "id":
+        return stmt.order_by(Contact.id).limit(limit + 1)
+    return stmt.order_by(column, Contact.id).limit(limit + 1)
+
 
+def split_page(rows: list, limit: int, sort: str) -> tuple[list, str | None]:
+    """
+    The split_page function cuts the rows fetched by a paginated query down to the page and builds the cursor
+    of the next page, only if the extra row fetched by paginate shows that there is one.
 
-async def get_contacts_all(limit: int, offset: int, db: AsyncSession):  
+    :param rows: list: The rows of a query paginated with paginate
+    :param limit: int: The page size
+    :param sort: str: The sort key of the listing
+    :return: At most limit rows and the cursor of the next page, or None on the last page
+    :doc-author: Trelent
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, rows[-1])
+
+
+
+async def get_contacts_all(limit: int, offset: int, db: AsyncSession, cursor: str | None = None, sort: str = "id"):  
     """
     The get_contacts_all function returns a list of all contacts in the database.
     
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the number of rows to skip
     :param db: AsyncSession: Pass in the database session, which is used to execute sql statements
-    :return: A list of contact objects
+    :param cursor: str | None: Continue after the page this cursor was returned with
+    :param sort: str: Order the contacts by this key
+    :return: A list of contact objects and the cursor of the next page
     :doc-author: Trelent
     """
-    stmt = select(Contact).offset(offset).limit(limit)
+    stmt = paginate(select(Contact), limit, offset, cursor, sort)
     contacts = await db.execute(stmt)
-    return contacts.scalars().all()
+    return split_page(contacts.scalars().all(), limit, sort)
+
+
+
+async def stream_contacts(db: AsyncSession, user: Principal | User, batch_size: int = 1000) -> AsyncIterator[Contact]:
+    """
+    The stream_contacts function yields all contacts of the user ordered by id from a server-side cursor,
+    fetching batch_size rows at a time, so the result is never held in memory as a whole.
+    The owner is not joined in: the contacts are for export, and touching contact.user raises.
+    
+    :param db: AsyncSession: A session that stays open while the contacts are consumed
+    :param user: User: Filter the contacts by user
+    :param batch_size: int: Number of rows fetched from the cursor at once
+    :return: An async iterator over contacts
+    :doc-author: Trelent
+    """
+    stmt = (
+        select(Contact)
+        .filter_by(user_id=user.id)
+        .options(raiseload(Contact.user))
+        .order_by(Contact.id)
+        .execution_options(yield_per=batch_size)
+    )
+    contacts = await db.stream_scalars(stmt)
+    async for contact in contacts:
+        yield contact
 
 
 
-async def get_contact_by_id(contact_id: int, db: AsyncSession, user: User):
+async def get_contact_by_id(contact_id: int, db: AsyncSession, user: Principal | User):
     """
     The get_contact_by_id function is used to retrieve a contact from the database.
     It takes in two parameters:
@@ -39,13 +191,29 @@ async def get_contact_by_id(contact_id: int, db: AsyncSession, user: User):
     :return: A single contact from the database
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    contact = await db.execute(stmt)
+    contact = await db.execute(CONTACT_BY_ID, {"contact_id": contact_id, "user_id": user.id})
     return contact.scalar_one_or_none()
 
 
 
-async def get_contacts_by_criteria(criteria: dict, limit: int, offset: int, db: AsyncSession, user: User):
+async def get_contact_versions(contact_id: int, db: AsyncSession, user: Principal | User):
+    """
+    The get_contact_versions function reads only what the ETag of a contact is made of,
+    so a conditional GET can be answered without loading the contact.
+    
+    :param contact_id: int: Specify the id of the contact
+    :param db: AsyncSession: Pass the database connection to the function
+    :param user: User: Check if the user is authorized to access this contact
+    :return: The updated_at of the contact and of its owner, or None if there is no such contact
+    :doc-author: Trelent
+    """
+    result = await db.execute(CONTACT_VERSIONS, {"contact_id": contact_id, "user_id": user.id})
+    return result.one_or_none()
+
+
+
+async def get_contacts_by_criteria(criteria: dict, limit: int, offset: int, db: AsyncSession, user: Principal | User,
+                                   cursor: str | None = None, sort: str = "id"):
     """
     The get_contacts_by_criteria function is used to retrieve contacts from the database based on a set of criteria.
     The function takes in three arguments:
@@ -59,18 +227,68 @@ async def get_contacts_by_criteria(criteria: dict, limit: int, offset: int, db:
     :param offset: int: Specify the number of records to skip
     :param db: AsyncSession: Pass in the database session
     :param user: User: Filter the contacts by user
-    :return: A list of contacts that match the criteria
+    :param cursor: str | None: Continue after the page this cursor was returned with
+    :param sort: str: Order the contacts by this key
+    :return: A list of contacts that match the criteria and the cursor of the next page
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(**criteria, user=user).limit(limit).offset(offset)
+    stmt = paginate(select(Contact).filter_by(**criteria, user_id=user.id), limit, offset, cursor, sort)
     contacts = await db.execute(stmt)
-    return contacts.scalars().all()
+    return split_page(contacts.scalars().all(), limit, sort)
+
+
+
+async def get_contact_rows_by_criteria(criteria: dict, limit: int, offset: int, db: AsyncSession,
+                                       user: Principal | User, cursor: str | None = None, sort: str = "id"):
+    """
+    The get_contact_rows_by_criteria function is the lean variant of get_contacts_by_criteria:
+    it selects only the contact columns, without joining the owner, and returns plain rows
+    instead of ORM objects.
+    
+    :param criteria: dict: Filter the contacts by any number of fields
+    :param limit: int: Limit the number of results returned
+    :param offset: int: Specify the number of records to skip
+    :param db: AsyncSession: Pass in the database session
+    :param user: User: Filter the contacts by user
+    :param cursor: str | None: Continue after the page this cursor was returned with
+    :param sort: str: Order the contacts by this key
+    :return: A list of rows with the CONTACT_COLUMNS and the cursor of the next page
+    :doc-author: Trelent
+    """
+    stmt = paginate(select(*CONTACT_COLUMNS).filter_by(**criteria, user_id=user.id), limit, offset, cursor, sort)
+    rows = await db.execute(stmt)
+    return split_page(rows.all(), limit, sort)
+
+
+
+def birthday_ranges(start: date, period: int) -> list[tuple[int, int]]:
+    """
+    The birthday_ranges function turns the period [start, start + period days] into ranges of MMDD birthday keys.
+    A period that passes the end of the year is split in two ranges. In a non-leap year a period ending on
+    28 February also covers 29 February, so people born on 29 February are not skipped.
+    
+    :param start: date: The first day of the period
+    :param period: int: Length of the period in days
+    :return: A list of inclusive (first, last) key ranges
+    :doc-author: Trelent
+    """
+    if period >= 365:
+        return [(101, 1231)]
+    end = start + timedelta(days=period)
+    first, last = birthday_key(start), birthday_key(end)
+    if last == 228 and not calendar.isleap(end.year):
+        last = 229
+    if end.year == start.year:
+        return [(first, last)]
+    return [(first, 1231), (101, last)]
 
 
 
-async def get_contacts_bd(period: int, limit: int, offset: int, db: AsyncSession, user: User):
+async def get_contacts_bd(period: int, limit: int, offset: int, db: AsyncSession, user: Principal | User):
     """
     The get_contacts_bd function returns a list of contacts that have birthdays in the next week.
+    The contacts are ordered by the upcoming birthday, and the query is a range scan over the
+    (user_id, birthday_key) index.
     
     :param period: int: Define the number of days in which we want to get contacts
     :param limit: int: Limit the number of contacts returned
@@ -81,23 +299,65 @@ async def get_contacts_bd(period: int, limit: int, offset: int, db: AsyncSession
     :doc-author: Trelent
     """
     current_date = date.today()
-    next_week_start = current_date
-    next_week_end = current_date + timedelta(days=period)
-    
-    condition = between(extract('month', Contact.birth_date), next_week_start.month, next_week_end.month) & \
-                between(extract('day', Contact.birth_date), next_week_start.day, next_week_end.day)
+    ranges = birthday_ranges(current_date, period)
+    condition = or_(*(Contact.birthday_key.between(first, last) for first, last in ranges))
+    # Birthdays still ahead this year come before the ones after the new year.
+    upcoming = case((Contact.birthday_key >= birthday_key(current_date), 0), else_=1)
     result = (
         await db.execute(
             select(Contact)
-            .filter_by(user=user)
+            .filter_by(user_id=user.id)
             .filter(condition)
+            .order_by(upcoming, Contact.birthday_key, Contact.id)
+            .limit(limit)
+            .offset(offset)
         )
     ).scalars().all()
     return result
 
 
 
-async def create_contact(body: ContactModel, db: AsyncSession, user: User):
+async def search_contacts(q: str, limit: int, db: AsyncSession, user: Principal | User):
+    """
+    The search_contacts function finds the user's contacts whose names, email or phone number contain
+    or resemble the query, best matches first.
+    On Postgres it uses the pg_trgm index over contact_search_document: substring matches (ILIKE) and
+    word-similarity matches (<%) are ranked by word_similarity. On SQLite it uses the contacts_fts
+    FTS5 trigram table ranked by bm25.
+    
+    :param q: str: The search text, at least three characters
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A list of contacts ordered by relevance
+    :doc-author: Trelent
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        # A quoted FTS5 string is matched as a substring by the trigram tokenizer.
+        match = '"' + q.replace('"', '""') + '"'
+        fts = table("contacts_fts", column("rowid"))
+        stmt = (
+            select(Contact)
+            .join(fts, fts.c.rowid == Contact.id)
+            .where(Contact.user_id == user.id, literal_column("contacts_fts").op("MATCH")(match))
+            .order_by(func.bm25(literal_column("contacts_fts")), Contact.id)
+            .limit(limit)
+        )
+    else:
+        document = contact_search_document()
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        stmt = (
+            select(Contact)
+            .where(Contact.user_id == user.id, or_(document.ilike(pattern), literal(q).op("<%")(document.self_group())))
+            .order_by(func.word_similarity(q, document).desc(), Contact.id)
+            .limit(limit)
+        )
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+
+async def create_contact(body: ContactModel, db: AsyncSession, user: Principal | User):
     """
     The create_contact function creates a new contact in the database.
     
@@ -107,44 +367,229 @@ async def create_contact(body: ContactModel, db: AsyncSession, user: User):
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = Contact(**body.model_dump(exclude_unset=True), user=user)
+    # Read before the commit, which expires the user when it was loaded in this session.
+    user_id = user.id
+    contact = Contact(**body.model_dump(exclude_unset=True), user_id=user_id)
     db.add(contact)
     await db.commit()
     await db.refresh(contact)
+    await autocomplete_index.changed(user_id, contact)
+    await contact_counter.changed(user_id, 1)
+    await contact_versions.bump(user_id)
+    await sessionmanager.mark_write(user_id)
     return contact
 
 
 
-async def update_contact(contact_id: int, body: ContactModel, db: AsyncSession, user: User):
+async def upsert_contacts(rows: list[dict], db: AsyncSession, user_id: int) -> dict[str, tuple[int, bool | None]]:
     """
-    The update_contact function updates a contact in the database.
+    The upsert_contacts function writes a batch of contacts with one multi-row
+    INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING statement and commits it.
+    A contact is only updated if it belongs to the user; rows whose email is taken by
+    a contact of another user are not returned.
+    
+    :param rows: list[dict]: Column values of the contacts, at most one row per email
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: The owner of the contacts
+    :return: A dict email -> (contact id, True if created / False if updated / None if unknown)
+    :doc-author: Trelent
+    """
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(Contact).values([{**row, "user_id": user_id} for row in rows])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Contact.email],
+        set_={name: stmt.excluded[name] for name in UPSERT_COLUMNS} | {"updated_at": func.now()},
+        where=Contact.user_id == stmt.excluded.user_id,
+    )
+    # xmax is 0 for a freshly inserted row version and set for an updated one.
+    created = literal_column("contacts.xmax = 0", Boolean) if dialect == "postgresql" else literal(None)
+    result = await db.execute(stmt.returning(Contact.id, Contact.email, created))
+    written = {email: (contact_id, is_created) for contact_id, email, is_created in result.all()}
+    await db.commit()
+    return written
 
+
+
+def validate_contact_row(item) -> tuple[dict | None, str | None]:
+    """
+    The validate_contact_row function checks one imported row against ContactModel.
+    
+    :param item: The parsed row
+    :return: The column values of the contact and None, or None and the validation error
+    :doc-author: Trelent
+    """
+    try:
+        body = ContactModel.model_validate(item)
+    except ValidationError as err:
+        return None, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+                               for e in err.errors())
+    if "email" not in body.model_fields_set or not body.email.strip():
+        return None, f"email: {messages.EMAIL_REQUIRED}"
+    values = body.model_dump()
+    values["birthday_key"] = birthday_key(values["birth_date"])
+    return values, None
+
+
+
+async def write_contacts_batch(chunk: dict[str, tuple[int, dict]], db: AsyncSession, user_id: int) -> list[dict]:
+    """
+    The write_contacts_batch function upserts a batch of validated rows and reports the result of each row.
+    A batch rejected by the database is rolled back and all its rows are reported as failed.
+    
+    :param chunk: dict[str, tuple[int, dict]]: email -> (row number, column values)
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: The owner of the contacts
+    :return: A list of row results
+    :doc-author: Trelent
+    """
+    try:
+        written = await upsert_contacts([values for _, values in chunk.values()], db, user_id)
+    except SQLAlchemyError:
+        await db.rollback()
+        return [{"row": row, "status": "failed", "error": messages.BATCH_REJECTED} for row, _ in chunk.values()]
+    results = []
+    for email, (row, _) in chunk.items():
+        if email not in written:
+            results.append({"row": row, "status": "conflict", "error": messages.CONTACT_OF_ANOTHER_USER})
+            continue
+        contact_id, created = written[email]
+        status = "upserted" if created is None else "created" if created else "updated"
+        results.append({"row": row, "status": status, "id": contact_id})
+    return results
+
+
+
+async def upsert_contacts_in_batches(items: AsyncIterator, db: AsyncSession, user: Principal | User,
+                                     chunk_size: int) -> AsyncIterator[list[dict]]:
+    """
+    The upsert_contacts_in_batches function validates contacts one by one against ContactModel and
+    creates or updates them in batches of chunk_size rows, one statement and one commit per batch,
+    so memory stays bounded however many rows come in. Rows are applied in order: when an email
+    repeats inside a batch, the batch is written first. The contact counter of the user is increased
+    by the created rows, or dropped when the database can not tell created rows from updated ones.
+    
+    :param items: AsyncIterator: Parsed rows, or JSONStreamError for rows that could not be parsed
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: The owner of the contacts
+    :param chunk_size: int: Number of rows written per statement
+    :return: An async iterator over the row results, one list per batch
+    :doc-author: Trelent
+    """
+    # Read once: every batch commits, which expires the user when it was loaded in this session.
+    user_id = user.id
+    results: list[dict] = []
+    chunk: dict[str, tuple[int, dict]] = {}
+    statuses = Counter()
+    row = -1
+    try:
+        async for item in items:
+            row += 1
+            if isinstance(item, JSONStreamError):
+                values, error = None, str(item)
+            else:
+                values, error = validate_contact_row(item)
+            if values is None:
+                results.append({"row": row, "status": "invalid", "error": error})
+            else:
+                if values["email"] in chunk or len(chunk) >= chunk_size:
+                    written = await write_contacts_batch(chunk, db, user_id)
+                    statuses.update(result["status"] for result in written)
+                    results.extend(written)
+                    chunk.clear()
+                chunk[values["email"]] = (row, values)
+            if len(results) >= chunk_size:
+                yield results
+                results = []
+    except JSONStreamError as err:
+        results.append({"row": row + 1, "status": "invalid", "error": str(err)})
+    if chunk:
+        written = await write_contacts_batch(chunk, db, user_id)
+        statuses.update(result["status"] for result in written)
+        results.extend(written)
+    if results:
+        yield results
+    if statuses["created"] or statuses["updated"] or statuses["upserted"]:
+        await autocomplete_index.invalidate(user_id)
+        await contact_versions.bump(user_id)
+        await sessionmanager.mark_write(user_id)
+    if statuses["upserted"]:
+        await contact_counter.invalidate(user_id)
+    elif statuses["created"]:
+        await contact_counter.changed(user_id, statuses["created"])
+
+
+
+async def attach_owner(contact: Contact, db: AsyncSession, user: Principal | User):
+    """
+    The attach_owner function fills contact.user of a contact loaded by an UPDATE/DELETE ... RETURNING,
+    which can not join the owner in. The current user already is the owner, so no query is needed,
+    unless the request was authenticated by a claims token and only a Principal is at hand.
+    
+    :param contact: Contact: The contact returned by the statement
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: The owner of the contact
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    owner = user
+    if not isinstance(user, User):
+        owner = await db.get(User, user.id)
+        if owner is not None:
+            db.expunge(owner)
+    set_committed_value(contact, "user", owner)
+
+
+
+async def update_contact(contact_id: int, body: ContactModel | ContactUpdateModel, db: AsyncSession,
+                         user: Principal | User, partial: bool = False):
+    """
+    The update_contact function updates a contact in the database with a single
+    UPDATE contacts SET ... WHERE id = :id AND user_id = :uid RETURNING ... statement.
+    
     :param contact_id: int: Identify which contact to update
-    :param body: ContactModel: Pass in the new contact information
+    :param body: ContactModel | ContactUpdateModel: Pass in the new contact information
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Get the user that is logged in
-    :return: A contact object
+    :param partial: bool: Only change the fields present in the body (PATCH)
+    :return: A contact object, or None if the user has no such contact
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact = result.scalar_one_or_none()
-    if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone_number = body.phone_number
-        contact.birth_date = body.birth_date
-        contact.additional_data = body.additional_data
-        await db.commit()
-        await db.refresh(contact)
+    values = body.model_dump(exclude_unset=partial)
+    if not values:
+        return await get_contact_by_id(contact_id, db, user)
+    if "birth_date" in values:
+        values["birthday_key"] = birthday_key(values["birth_date"])
+    # Read before the commit, which expires the user when it was loaded in this session.
+    user_id = user.id
+    stmt = (
+        update(Contact)
+        .where(Contact.id == contact_id, Contact.user_id == user_id)
+        .values(**values)
+        .returning(Contact)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    contact = (await db.execute(stmt)).scalar_one_or_none()
+    if contact is None:
+        return None
+    await attach_owner(contact, db, user)
+    # Detached before the commit, so the commit does not expire what RETURNING loaded.
+    db.expunge(contact)
+    await db.commit()
+    if contact.user is not None and contact.user in db:
+        # The owner is the user of this session, expired by the commit: load it again for the response.
+        await db.refresh(contact.user)
+    await autocomplete_index.changed(user_id, contact)
+    await contact_versions.bump(user_id)
+    await sessionmanager.mark_write(user_id)
     return contact
 
 
 
-async def delete_contact(contact_id: int, db: AsyncSession, user: User):
+async def delete_contact(contact_id: int, db: AsyncSession, user: Principal | User):
     """
-    The delete_contact function deletes a contact from the database.
+    The delete_contact function deletes a contact from the database with a single
+    DELETE FROM contacts WHERE id = :id AND user_id = :uid RETURNING ... statement.
     
     :param contact_id: int: Specify the contact to delete
     :param db: AsyncSession: Pass the database session to the function
@@ -152,12 +597,37 @@ async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     :return: The contact object if it was deleted,
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact = result.scalar_one_or_none()
-    if contact:
-        await db.delete(contact)
-        await db.commit()
+    # Read before the commit, which expires the user when it was loaded in this session.
+    user_id = user.id
+    stmt = (
+        delete(Contact)
+        .where(Contact.id == contact_id, Contact.user_id == user_id)
+        .returning(Contact)
+        .execution_options(synchronize_session=False)
+    )
+    contact = (await db.execute(stmt)).scalar_one_or_none()
+    if contact is None:
+        return None
+    db.expunge(contact)
+    await db.commit()
+    await autocomplete_index.changed(user_id, deleted_id=contact_id)
+    await contact_counter.changed(user_id, -1)
+    await contact_versions.bump(user_id)
+    await sessionmanager.mark_write(user_id)
     return contact
 
 
+
+async def autocomplete_contacts(prefix: str, limit: int, user: Principal | User):
+    """
+    The autocomplete_contacts function suggests contacts whose first name, last name, full name or email
+    starts with the prefix. It is served from the in-memory index of the user, the database is read only
+    to build the index on first use.
+    
+    :param prefix: str: The text typed so far
+    :param limit: int: Limit the number of contacts returned
+    :param user: User: Filter the contacts by user
+    :return: A list of dicts with id, first_name, last_name and email
+    :doc-author: Trelent
+    """
+    return await autocomplete_index.search(prefix, limit, user.id)
@@ -1,11 +1,17 @@
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio  import AsyncSession
 from src.schemas.user import UserSchema
 from libgravatar import Gravatar
 
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
 from src.entity.models import User
+from src.services.user_cache import user_cache
+from src.services.etags import contact_versions
+from src.services.refresh_tokens import refresh_token_store
+
+# Built once, so its cache key is memoized and a lookup only binds the email.
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
 
 
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
@@ -18,8 +24,7 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     :return: A single user
     :doc-author: Trelent
     """
-    stmt = select(User).filter_by(email=email)
-    user = await db.execute(stmt)
+    user = await db.execute(USER_BY_EMAIL, {"email": email})
     user = user.scalar_one_or_none()
     return user
 
@@ -58,8 +63,10 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     :return: The user object
     :doc-author: Trelent
     """
+    email = user.email
     user.refresh_token = token
     await db.commit()
+    await user_cache.invalidate(email)
 
 
 async def confirmed_email(email: str, db: AsyncSession):
@@ -75,7 +82,10 @@ async def confirmed_email(email: str, db: AsyncSession):
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
+    user_id, role = user.id, user.role
     await db.commit()
+    await user_cache.invalidate(email)
+    await refresh_token_store.update_claims(user_id, role, True)
 
 
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
@@ -92,4 +102,8 @@ async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> Us
     user.avatar = url
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(email)
+    # The owner is a part of every contact in the listings.
+    await contact_versions.bump(user.id)
+    await sessionmanager.mark_write(user.id)
     return user
\ No newline at end of file
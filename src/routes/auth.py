@@ -1,3 +1,5 @@
+import time
+
 from fastapi import APIRouter, Body, HTTPException, Depends, Security, status, BackgroundTasks, Request
 from fastapi.security import HTTPAuthorizationCredentials, OAuth2PasswordRequestForm, HTTPBearer
 from sqlalchemy.ext.asyncio  import AsyncSession
@@ -7,8 +9,11 @@ from src.database.db import get_db
 from src.repository import users as repository_users
 
 from src.conf import messages
-from src.schemas.user import RequestEmail, UserSchema, TokenSchema, UserResponse
-from src.services.auth import auth_service
+from src.conf.config import config
+from src.entity.models import Role, User
+from src.schemas.user import RequestEmail, UserSchema, TokenSchema, UserResponse, SessionResponse
+from src.services.auth import auth_service, Principal
+from src.services.refresh_tokens import refresh_token_store, ROTATED, REUSED
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
@@ -32,7 +37,7 @@ async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: As
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST)
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     
@@ -41,12 +46,14 @@ async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: As
 
 
 @router.post("/login", response_model=TokenSchema, status_code=status.HTTP_202_ACCEPTED, name="Login")
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
         It takes the email and password of the user as input,
         and returns an access token if authentication was successful.
+        Every login opens a new refresh token family in redis, one per device session.
     
+    :param request: Request: Get the user agent that labels the session
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
     :param db: AsyncSession: Get the database session
     :return: A dict with the access_token and refresh_token
@@ -58,43 +65,107 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.EMAIL_NOT_CONFIRMED)    
     
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_PASSWORD)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email, "test":"Мій токен"}) #payload
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    device = body.client_id or request.headers.get("user-agent")
+    family, jti = await refresh_token_store.start(user, device, auth_service.REFRESH_TOKEN_TTL)
+    claims_user = user if config.AUTH_CLAIMS_TOKENS else None
+    access_token = await auth_service.create_access_token(data={"sub": user.email, "fam": family, "test":"Мій токен"}, user=claims_user) #payload
+    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, "fam": family, "jti": jti})
 
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 
 @router.get('/refresh_token', response_model=TokenSchema, status_code=status.HTTP_202_ACCEPTED, name="Update token")
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(get_refresh_token), db: AsyncSession = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(get_refresh_token),
+                        db: AsyncSession = Depends(get_db)):
     """
     The refresh_token function is used to refresh the access token.
         The function takes in a refresh token and returns an access_token, a new refresh_token, and the type of token.
+        The refresh token is rotated inside its family in redis. In claims mode the role and confirmation
+        come from the family and are read again from the database once they are older than AUTH_CLAIMS_MAX_AGE.
+        Reusing an already rotated refresh token revokes the whole family.
     
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: AsyncSession: Get the database session
+    :param db: AsyncSession: Read the user when the claims of the family are too old
     :return: The access_token and refresh_token in the response
     :doc-author: Trelent
     """
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, db, token=None)
-        user.refresh_token = None
-        db.commit()
+    payload = auth_service.decode_token(token)
+    if "fam" not in payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
+    result, session, jti = await refresh_token_store.rotate(payload["fam"], payload["jti"], auth_service.REFRESH_TOKEN_TTL)
+    if result != ROTATED:
+        if result == REUSED:
+            await auth_service.revoke_user_tokens(int(session["uid"]))
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
+    claims_user = None
+    if config.AUTH_CLAIMS_TOKENS:
+        claims_user = Principal(id=int(session["uid"]), email=email, role=Role(session["role"]) if session["role"] else None,
+                                confirmed=session["cnf"] == "1")
+        if time.time() - int(session.get("claims_at", 0)) > config.AUTH_CLAIMS_MAX_AGE:
+            # Roles changed outside the users repository reach the tokens of a family at this point at the latest.
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                await refresh_token_store.revoke(claims_user.id, payload["fam"])
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
+            claims_user = Principal(id=user.id, email=user.email, role=user.role, confirmed=bool(user.confirmed))
+            await refresh_token_store.update_claims(user.id, user.role, user.confirmed)
+    access_token = await auth_service.create_access_token(data={"sub": email, "fam": payload["fam"]}, user=claims_user)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, "fam": payload["fam"], "jti": jti})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT, name="Logout")
+async def logout(token: str = Depends(auth_service.oauth2_scheme),
+                 user: Principal | User = Depends(auth_service.get_principal)):
+    """
+    The logout function revokes the access token of the request and ends its login session,
+        so neither the access token nor the refresh token issued with it can be used again.
+    
+    :param token: str: Get the access token from the request header
+    :param user: Principal | User: Get the current user
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    payload = await auth_service.logout(token)
+    if "fam" in payload:
+        await refresh_token_store.revoke(user.id, payload["fam"])
+
+
+
+@router.get('/sessions', response_model=list[SessionResponse], name="Active login sessions")
+async def get_sessions(user: Principal | User = Depends(auth_service.get_principal)):
+    """
+    The get_sessions function lists the active login sessions (refresh token families) of the current user.
+    
+    :param user: Principal | User: Get the current user
+    :return: A list of sessions with their device label and creation time
+    :doc-author: Trelent
+    """
+    return await refresh_token_store.sessions(user.id)
+
+
+
+@router.delete('/sessions/{family}', status_code=status.HTTP_204_NO_CONTENT, name="Revoke login session")
+async def revoke_session(family: str, user: Principal | User = Depends(auth_service.get_principal)):
+    """
+    The revoke_session function ends one login session: its refresh token can no longer be used.
+    
+    :param family: str: The id of the session
+    :param user: Principal | User: Get the current user
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    await refresh_token_store.revoke(user.id, family)
+
+
+
 @router.get('/confirmed_email/{token}', name="Route for email confirmation")
 async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
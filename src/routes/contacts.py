@@ -1,33 +1,110 @@
-from fastapi import APIRouter, Body, HTTPException, Depends, status, Path, Query
+import json
+from collections import Counter
+from typing import Literal
+
+import anyio
+from fastapi import APIRouter, BackgroundTasks, Body, File, HTTPException, Depends, status, Path, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio  import AsyncSession
 from src.services.role import RoleAccess
 from src.entity.models import Role, User
 
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
 from src.repository import contacts as repository_contacts
 
 from src.conf import messages
-from src.schemas.contact import ContactModel, ContactResponse
-from src.services.auth import auth_service
+from src.conf.config import config
+from src.schemas.contact import (ContactModel, ContactUpdateModel, ContactResponse, ContactSuggestion, BulkRowResult,
+                                 ImportJobResponse, ContactPage, contact_page_adapter)
+from src.services.auth import auth_service, Principal
+from src.services.contact_counts import contact_counter
+from src.services.etags import contact_etag, contact_versions, etag_matches
+from src.services.export import EXPORT_FORMATS, export_chunks
+from src.services.import_jobs import import_format, import_jobs, spool_upload
+from src.services.json_stream import iter_json_items
+from src.services.read_db import get_read_db
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
 
 access_to_rote_all = RoleAccess([Role.admin, Role.moderator])
 
+SortKey = Literal["id", "first_name", "email"]
+
+
+def set_next_page_headers(request: Request, response: Response, cursor: str | None):
+    """
+    The set_next_page_headers function advertises the cursor of the next page
+        in an X-Next-Cursor header and an RFC 8288 Link header with rel="next".
+        Nothing is sent on the last page.
+    
+    :param request: Request: Get the url of the current page
+    :param response: Response: Set the headers
+    :param cursor: str | None: The cursor of the next page, None on the last page
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    if cursor is not None:
+        url = request.url.remove_query_params("offset").include_query_params(cursor=cursor)
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{url}>; rel="next"'
+
+
+def set_total_count_headers(response: Response, total: int, capped: bool):
+    """
+    The set_total_count_headers function sends the number of contacts matching the listing in an X-Total-Count header.
+        Counts of filtered listings stop at CONTACT_COUNT_CAP, which is flagged by X-Total-Count-Capped.
+    
+    :param response: Response: Set the headers
+    :param total: int: The number of matching contacts
+    :param capped: bool: Whether the count stopped at the cap
+    :return: Nothing
+    :doc-author: Trelent
+    """
+    response.headers["X-Total-Count"] = str(total)
+    if capped:
+        response.headers["X-Total-Count-Capped"] = "true"
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """
+    The not_modified function answers a conditional GET whose If-None-Match matches the current ETag.
+    
+    :param request: Request: Get the If-None-Match header
+    :param etag: str: The current ETag
+    :return: A 304 response, or None if the client does not have the current representation
+    :doc-author: Trelent
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+async def list_etag(request: Request, user: Principal | User) -> str:
+    return await contact_versions.list_etag(user.id, request.url.path, sorted(request.query_params.multi_items()))
+
 
 
 @router.get("/", response_model=list[ContactResponse], name="Find contacts with or without criteria")
 async def get_contacts(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     limit: int = Query(default=10, ge=10, le=500),
     offset: int = Query(default=0, ge=0),
+    cursor: str = Query(default=None),
+    sort: SortKey = Query(default="id"),
     first_name: str = Query(default=None),
     last_name: str = Query(default=None),
     email: str = Query(default=None),
-    user: User = Depends(auth_service.get_current_user)
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The get_contacts function returns a list of contacts.
+        Pages are ordered by the sort key. Pass the X-Next-Cursor of a page as cursor to get the next one
+        in constant time; offset is still accepted when no cursor is given.
+        The number of matching contacts is sent in the X-Total-Count header.
+        The ETag changes with every write to the user's contacts; a request with a matching If-None-Match
+        gets 304 Not Modified before the contacts are queried.
 
     :param db: AsyncSession: Get the database session
     :param limit: int: Limit the number of contacts returned by the api
@@ -35,6 +112,8 @@ async def get_contacts(
     :param le: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip
     :param ge: Specify a minimum value for the limit parameter
+    :param cursor: str: Continue after the page this cursor was returned with
+    :param sort: SortKey: Order the contacts by id, first_name or email
     :param first_name: str: Filter the contacts by first name
     :param last_name: str: Filter the contacts by last name
     :param email: str: Filter the contacts by email
@@ -45,22 +124,97 @@ async def get_contacts(
 
     criteria = {'first_name': first_name, 'last_name': last_name, 'email': email}
     criteria = {k:v for k, v in criteria.items() if v is not None}
+    etag = await list_etag(request, user)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
     # if first_name is None and last_name is None and email is None:
     #     contacts = await repository_contacts.get_contacts_all(limit, offset, db)
     # else:
-    contacts = await repository_contacts.get_contacts_by_criteria(criteria, limit, offset, db, user)
+    try:
+        contacts, next_cursor = await repository_contacts.get_contacts_by_criteria(criteria, limit, offset, db, user,
+                                                                                    cursor, sort)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR)
     if not contacts:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_FOUND)
+    set_next_page_headers(request, response, next_cursor)
+    set_total_count_headers(response, *await contact_counter.total(db, user.id, criteria))
+    response.headers["ETag"] = etag
     return contacts
 
 
 
+@router.get("/page", response_model=ContactPage, name="Find contacts, lean page")
+async def get_contacts_page(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    limit: int = Query(default=10, ge=10, le=500),
+    offset: int = Query(default=0, ge=0),
+    cursor: str = Query(default=None),
+    sort: SortKey = Query(default="id"),
+    first_name: str = Query(default=None),
+    last_name: str = Query(default=None),
+    email: str = Query(default=None),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The get_contacts_page function returns the same contacts as get_contacts in an envelope:
+        the owner is sent once next to the page instead of inside every contact, rows are read as plain
+        columns without joining users, and the page is serialized by a precompiled TypeAdapter.
+        Conditional GETs are answered like in get_contacts.
+    
+    :param request: Request: Build the link to the next page
+    :param db: AsyncSession: Get the database session
+    :param limit: int: Limit the number of contacts returned by the api
+    :param offset: int: Specify the number of records to skip
+    :param cursor: str: Continue after the page this cursor was returned with
+    :param sort: SortKey: Order the contacts by id, first_name or email
+    :param first_name: str: Filter the contacts by first name
+    :param last_name: str: Filter the contacts by last name
+    :param email: str: Filter the contacts by email
+    :param user: User: Get the current user
+    :return: A dict with user, contacts, next_cursor and total
+    :doc-author: Trelent
+    """
+    criteria = {'first_name': first_name, 'last_name': last_name, 'email': email}
+    criteria = {k:v for k, v in criteria.items() if v is not None}
+    etag = await list_etag(request, user)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    try:
+        rows, next_cursor = await repository_contacts.get_contact_rows_by_criteria(criteria, limit, offset, db, user,
+                                                                                    cursor, sort)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_FOUND)
+    owner = await auth_service.load_user(user, db)
+    total, capped = await contact_counter.total(db, user.id, criteria)
+    page = {
+        "user": {"id": owner.id, "username": owner.username, "email": owner.email, "avatar": owner.avatar,
+                 "role": owner.role},
+        "contacts": [row._asdict() for row in rows],
+        "next_cursor": next_cursor,
+        "total": total,
+    }
+    response = Response(content=contact_page_adapter.dump_json(page), media_type="application/json")
+    set_total_count_headers(response, total, capped)
+    response.headers["ETag"] = etag
+    set_next_page_headers(request, response, next_cursor)
+    return response
+
+
+
 @router.get('/all', response_model=list[ContactResponse], name="Find all contacts", dependencies=[Depends(access_to_rote_all)])
 async def get_contacts_all(
+    request: Request,
+    response: Response,
     limit: int = Query(default=10, ge=10, le=500),
     offset: int = Query(default=0, ge=0),
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    cursor: str = Query(default=None),
+    sort: SortKey = Query(default="id"),
+    db: AsyncSession = Depends(get_read_db),
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The get_contacts_all function returns a list of contacts.
@@ -70,35 +224,130 @@ async def get_contacts_all(
     :param le: Limit the number of contacts returned to 500
     :param offset: int: Skip the first offset contacts
     :param ge: Set the minimum value for the limit parameter
+    :param cursor: str: Continue after the page this cursor was returned with
+    :param sort: SortKey: Order the contacts by id, first_name or email
     :param db: AsyncSession: Pass the database session to this function
     :param user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts_all(limit, offset, db)
+    try:
+        contacts, next_cursor = await repository_contacts.get_contacts_all(limit, offset, db, cursor, sort)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    set_next_page_headers(request, response, next_cursor)
+    set_total_count_headers(response, *await contact_counter.total_all(db))
     return contacts
 
 
 
 
+@router.get('/search', response_model=list[ContactResponse], name="Search contacts")
+async def search_contacts(
+    q: str = Query(min_length=3, max_length=100),
+    limit: int = Query(default=10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The search_contacts function finds contacts by a part of their first name, last name, email or phone number,
+        e.g. "joh" or a few digits of a phone number. The best matches come first.
+    
+    :param q: str: The text to search for
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user
+    :return: A list of contacts ordered by relevance
+    :doc-author: Trelent
+    """
+    return await repository_contacts.search_contacts(q, limit, db, user)
+
+
+
+
+@router.get('/autocomplete', response_model=list[ContactSuggestion], name="Autocomplete contacts")
+async def autocomplete_contacts(
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The autocomplete_contacts function suggests contacts for a typeahead field on every keystroke.
+        Suggestions come from an in-memory index of the user's names and emails, not from the database.
+    
+    :param prefix: str: The text typed so far
+    :param limit: int: Limit the number of suggestions
+    :param user: User: Get the current user
+    :return: A list of suggestions with id, names and email
+    :doc-author: Trelent
+    """
+    return await repository_contacts.autocomplete_contacts(prefix, limit, user)
+
+
+
+
+@router.get('/export', response_class=StreamingResponse, name="Export contacts")
+async def export_contacts(
+    format: Literal["csv", "ndjson", "vcf"] = Query(default="csv"),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The export_contacts function downloads all contacts of the user as CSV, NDJSON or vCard.
+        Rows are streamed from a server-side cursor straight into the response, so the first bytes
+        are sent at once and memory stays flat however many contacts there are.
+        The response outlives request dependencies, so the export reads through its own session,
+        routed to a replica like get_read_db. A database error aborts the response.
+    
+    :param format: str: csv, ndjson or vcf
+    :param user: User: Get the current user
+    :return: A streaming response with the contacts
+    :doc-author: Trelent
+    """
+    media_type, extension, _, _ = EXPORT_FORMATS[format]
+
+    primary = await sessionmanager.wrote_recently(user.id)
+
+    async def body():
+        # Not read_session(): an error must abort the response instead of ending a truncated file with 200.
+        async with sessionmanager.pick_session_maker(read_only=True, primary=primary)() as db:
+            async for chunk in export_chunks(repository_contacts.stream_contacts(db, user), format):
+                yield chunk
+
+    headers = {"Content-Disposition": f'attachment; filename="contacts.{extension}"'}
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+
+
 @router.get('/{contact_id}', response_model=ContactResponse, name="Find contact by ID")
 async def get_contact_by_id(
+    request: Request,
+    response: Response,
     contact_id: int=Path(ge=1),
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The get_contact_by_id function returns a contact by its id.
+        The ETag is made of the id and updated_at; a request with a matching If-None-Match
+        gets 304 Not Modified after reading just these columns.
     
+    :param request: Request: Get the If-None-Match header
+    :param response: Response: Set the ETag header
     :param contact_id: int: Get the contact id from the path
     :param db: AsyncSession: Get the database session
     :param user: User: Get the current user from the auth_service
     :return: A contact object
     :doc-author: Trelent
     """
+    if request.headers.get("if-none-match"):
+        versions = await repository_contacts.get_contact_versions(contact_id, db, user)
+        if versions is not None and (cached := not_modified(request, contact_etag(contact_id, *versions))) is not None:
+            return cached
     contact = await repository_contacts.get_contact_by_id(contact_id, db, user)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_FOUND)
+    response.headers["ETag"] = contact_etag(contact.id, contact.updated_at, contact.user.updated_at)
     return contact
 
 
@@ -106,11 +355,11 @@ async def get_contact_by_id(
 
 @router.get("/birthdays/", response_model=list[ContactResponse], name="Find contacts with birthday for period")
 async def get_contacts_bd(
-    period: int = Query(7),
-    limit: int = Query(10, le=1000),
-    offset: int = 0,
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    period: int = Query(7, ge=0, le=366),
+    limit: int = Query(10, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The get_contacts_bd function returns a list of contacts with birthday for period.
@@ -139,7 +388,7 @@ async def get_contacts_bd(
 async def create_contact(
     body: ContactModel, 
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The create_contact function creates a new contact in the database.
@@ -155,12 +404,116 @@ async def create_contact(
 
 
 
-@router.put('/{contact_id}', name="Change contact info")
+BULK_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": ContactModel.model_json_schema()}},
+            "application/x-ndjson": {"schema": {"type": "string"}},
+        },
+    },
+}
+
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    A streaming response sent while the request body is still being read. StreamingResponse reads receive
+    to notice a disconnect, which would take the body chunks away from request.stream(); the body reader
+    notices the disconnect instead.
+    """
+    async def listen_for_disconnect(self, receive):
+        await anyio.sleep_forever()
+
+
+@router.post('/bulk', response_class=RequestBodyStreamingResponse, name="Create or update contacts in bulk",
+             openapi_extra=BULK_REQUEST_BODY)
+async def bulk_upsert_contacts(
+    request: Request,
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The bulk_upsert_contacts function creates contacts from a JSON array or an NDJSON stream,
+        updating the user's contacts that already have the same email.
+        The body is parsed and written while it is being received, in batches of BULK_CHUNK_SIZE rows,
+        and the result of every batch is streamed back as NDJSON, so memory stays bounded however many
+        rows come in. The last line is the summary by status.
+        The response outlives request dependencies, so the rows are written through their own session.
+    
+    :param request: Request: Read the body as a stream
+    :param user: User: Get the current user
+    :return: An NDJSON stream with the status (created, updated, invalid, conflict, failed) of every row
+    :doc-author: Trelent
+    """
+    async def body():
+        summary = Counter()
+        async with sessionmanager.pick_session_maker()() as db:
+            batches = repository_contacts.upsert_contacts_in_batches(iter_json_items(request.stream()), db, user,
+                                                                     config.BULK_CHUNK_SIZE)
+            async for results in batches:
+                summary.update(result["status"] for result in results)
+                yield "".join(BulkRowResult.model_validate(result).model_dump_json(exclude_none=True) + "\n"
+                              for result in results)
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return RequestBodyStreamingResponse(body(), media_type="application/x-ndjson")
+
+
+
+@router.post('/import', response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED,
+             name="Import contacts from a file")
+async def import_contacts(
+    bt: BackgroundTasks,
+    file: UploadFile = File(),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The import_contacts function starts an import of a CSV, vCard, JSON or NDJSON address book.
+        The upload is spooled to disk and processed in the background after the response is sent;
+        the progress is available at /contacts/import/{job_id}.
+    
+    :param bt: BackgroundTasks: Run the import after the response
+    :param file: UploadFile: The address book
+    :param user: User: Get the current user
+    :return: The queued import job
+    :doc-author: Trelent
+    """
+    fmt = import_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=messages.UNSUPPORTED_IMPORT_FORMAT)
+    try:
+        path = await spool_upload(file, config.IMPORT_MAX_BYTES)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=messages.FILE_TOO_LARGE)
+    job_id = await import_jobs.create(user.id, file.filename, fmt)
+    bt.add_task(import_jobs.run, job_id, path, fmt, user)
+    return await import_jobs.get(job_id)
+
+
+
+@router.get('/import/{job_id}', response_model=ImportJobResponse, name="Import job status")
+async def get_import_job(job_id: str, user: Principal | User = Depends(auth_service.get_principal)):
+    """
+    The get_import_job function reports the status and progress of an import started by the current user:
+        rows processed, counts by result, throughput and the first row errors.
+    
+    :param job_id: str: The id of the import job
+    :param user: User: Get the current user
+    :return: The import job
+    :doc-author: Trelent
+    """
+    job = await import_jobs.get(job_id)
+    if job is None or job["user_id"] != user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMPORT_JOB_NOT_FOUND)
+    return job
+
+
+
+@router.put('/{contact_id}', response_model=ContactResponse, name="Change contact info")
 async def update_contact(
     body: ContactModel,
     contact_id: int = Path(ge=1),
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The update_contact function updates a contact in the database.
@@ -181,11 +534,36 @@ async def update_contact(
 
 
 
+@router.patch('/{contact_id}', response_model=ContactResponse, name="Change some contact fields")
+async def patch_contact(
+    body: ContactUpdateModel,
+    contact_id: int = Path(ge=1),
+    db: AsyncSession = Depends(get_db),
+    user: Principal | User = Depends(auth_service.get_principal)
+    ):
+    """
+    The patch_contact function changes only the fields sent in the request body,
+        the other fields of the contact keep their values.
+    
+    :param body: ContactUpdateModel: The fields to change
+    :param contact_id: int: Get the contact id from the url
+    :param db: AsyncSession: Pass the database session to the repository
+    :param user: User: Get the current user from the auth_service
+    :return: The updated contact
+    :doc-author: Trelent
+    """
+    contact = await repository_contacts.update_contact(contact_id, body, db, user, partial=True)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_FOUND)
+    return contact
+
+
+
 @router.delete('/{contact_id}', status_code=status.HTTP_204_NO_CONTENT, name="Delete contact by ID")
 async def delete_contact(
     contact_id: int=Path(ge=1),
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(auth_service.get_current_user)
+    user: Principal | User = Depends(auth_service.get_principal)
     ):
     """
     The delete_contact function deletes a contact from the database.
@@ -1,4 +1,3 @@
-import pickle
 import cloudinary
 import cloudinary.uploader
 
@@ -8,13 +7,16 @@ from sqlalchemy.ext.asyncio  import AsyncSession
 from src.database.db import get_db
 
 from src.schemas.user import UserResponse
-from src.entity.models import User
+from src.entity.models import Role, User
 from src.conf.config import config
 from src.services.auth import auth_service
+from src.services.role import RoleAccess
+from src.services.user_cache import user_cache
 from src.repository import users as repository_users
 
 
 router = APIRouter(prefix='/users', tags=['users'])
+access_to_cache_stats = RoleAccess([Role.admin])
 cloudinary.config(cloud_name=config.CLD_NAME, api_key=config.CLD_API_KEY, api_secret=config.CLD_API_SECRET, secure=True)
 
 @router.get("/me", response_model=UserResponse,
@@ -56,8 +58,18 @@ async def get_current_user(file: UploadFile = File(),
     res = cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
     res_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop="fill", version=res.get("version"))
 
-    await repository_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
+    user = await repository_users.update_avatar_url(user.email, res_url, db)
+    return user
+
 
-    return user
\ No newline at end of file
+
+@router.get("/cache_stats", name="Current-user cache statistics", dependencies=[Depends(access_to_cache_stats)])
+async def get_cache_stats():
+    """
+    The get_cache_stats function reports hit and miss counters of the current-user cache in this worker.
+    The local counters show how much redis traffic the in-process cache removes.
+    
+    :return: A dict with local and redis counters
+    :doc-author: Trelent
+    """
+    return user_cache.stats()
@@ -1,6 +1,9 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter
 from datetime import datetime, date
 from typing import Optional
+from typing_extensions import TypedDict
+
+from src.entity.models import Role
 
 from src.schemas.user import UserResponse
 
@@ -14,6 +17,50 @@ class ContactModel(BaseModel):
     additional_data: str = Field()
     
 
+class ContactUpdateModel(BaseModel):
+    # Omitted fields are left unchanged; only birth_date can be set to null.
+    first_name: str = Field(default=None, max_length=25)
+    last_name: str = Field(default=None, max_length=25)
+    email: EmailStr = Field(default=None, max_length=50)
+    phone_number: str = Field(default=None, max_length=20)
+    birth_date: date | None = None
+    additional_data: str = Field(default=None)
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+
+
+class BulkRowResult(BaseModel):
+    row: int
+    status: str
+    id: int | None = None
+    error: str | None = None
+
+
+class ImportJobResponse(BaseModel):
+    job_id: str
+    status: str
+    format: str
+    filename: str
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    upserted: int = 0
+    invalid: int = 0
+    conflict: int = 0
+    failed: int = 0
+    rows_per_sec: float = 0
+    error: str | None = None
+    errors: list[BulkRowResult] = []
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
 class ContactResponse(BaseModel):
     id: int = 1
     first_name: str
@@ -28,4 +75,36 @@ class ContactResponse(BaseModel):
 
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Lean read path: rows are plain dicts serialized straight to JSON by a precompiled TypeAdapter,
+# without building a model per row.
+class ContactRow(TypedDict):
+    id: int
+    first_name: str
+    last_name: str | None
+    email: str
+    phone_number: str
+    birth_date: date | None
+    additional_data: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class OwnerRow(TypedDict):
+    id: int
+    username: str
+    email: str
+    avatar: str | None
+    role: Role | None
+
+
+class ContactPage(TypedDict):
+    user: OwnerRow
+    contacts: list[ContactRow]
+    next_cursor: str | None
+    total: int
+
+
+contact_page_adapter = TypeAdapter(ContactPage)
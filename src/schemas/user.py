@@ -30,5 +30,11 @@ class TokenSchema(BaseModel):
     token_type: str
 
 
+class SessionResponse(BaseModel):
+    family: str
+    device: str
+    created: int
+
+
 class RequestEmail(BaseModel):
     email: EmailStr
\ No newline at end of file
@@ -1,31 +1,63 @@
-import pickle
+import hashlib
+import time
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from src.database.db import get_db
+from src.database.cache import redis_manager
+from src.entity.models import Role, User
+from src.services.invalidation import invalidation_bus
+from src.services.lru_cache import LRUCache
+from src.services import passwords
+from src.services.passwords import password_hasher
+from src.services.revocation import token_denylist
+from src.services.user_cache import user_cache
 from src.repository import users as repository_users
 from src.conf import messages
 from src.conf.config import config
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    email: str
+    role: Role | None
+    confirmed: bool
+
+
 class Auth:
 
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = passwords.pwd_context
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
-    cache = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    ACCESS_TOKEN_TTL = config.ACCESS_TOKEN_TTL
+    CLAIMS_TOKEN_TTL = config.CLAIMS_ACCESS_TOKEN_TTL
+    REFRESH_TOKEN_TTL = 7 * 24 * 3600
+    token_cache = LRUCache(maxsize=config.TOKEN_CACHE_SIZE, ttl=0)
+
+    def __init__(self):
+        # user id -> unix time before which claims tokens of the user are revoked. A plain dict rather than
+        # an LRU: a revocation must stay in force until the last token it covers has expired.
+        self.revoked_users: dict[int, int] = {}
+        self._prune_revocations_at = config.REVOKED_USERS_PRUNE_SIZE
+        invalidation_bus.subscribe("revoke", self._revoke_local)
 
-    def verify_password(self, plain_password, hashed_password):
+    @property
+    def cache(self):
+        return redis_manager.client
+
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function is used to verify a plain-text password against a hashed password.
         The function returns True if the passwords match, and False otherwise.
+        The check runs in the password hashing executor, so it does not block the event loop.
         
         :param self: Make the method work for a specific instance of the class
         :param plain_password: Verify the password that is entered by the user
@@ -33,41 +65,49 @@ class Auth:
         :return: True if the plain_password is correct,
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.run(passwords.verify_password, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password and returns the hashed version of it.
         The hashing algorithm is defined in the config file.
+        Hashing runs in the password hashing executor, so it does not block the event loop.
         
         :param self: Represent the instance of the class
         :param password: str: Specify the password that is to be hashed
         :return: A hashed password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await password_hasher.run(passwords.hash_password, password)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
     # define a function to generate a new access token
-    async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
+    async def create_access_token(self, data: dict, expires_delta: Optional[float] = None,
+                                  user: User | Principal | None = None):
         """
         The create_access_token function creates a new access token.
-            
+            When a user is passed, the token is a claims token: the user's id, role and confirmed flag
+            are signed into it, so get_principal can authenticate requests without any I/O.
+            Claims tokens live CLAIMS_ACCESS_TOKEN_TTL seconds unless expires_delta is given.
         
         :param self: Refer to the current instance of a class
         :param data: dict: Pass the data that will be encoded into the token
         :param expires_delta: Optional[float]: Set the expiration time of the access token
+        :param user: User | Principal | None: Embed the claims of this user into the token
         :return: An encoded access token
         :doc-author: Trelent
         """
         to_encode = data.copy()
+        if user is not None:
+            to_encode.update({"uid": user.id, "role": user.role.value if user.role else None, "cnf": user.confirmed})
+            expires_delta = expires_delta or self.CLAIMS_TOKEN_TTL
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
+            expire = datetime.utcnow() + timedelta(seconds=self.ACCESS_TOKEN_TTL)
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid.uuid4().hex})
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
@@ -90,12 +130,34 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=self.REFRESH_TOKEN_TTL)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
 
+    def decode_token(self, token: str) -> dict:
+        """
+        The decode_token function verifies a JWT and returns its claims.
+        Verified payloads are cached by the SHA-256 digest of the token until the token's exp claim,
+        so a client reusing the same token does not pay for signature verification on every request.
+        Invalid tokens are never cached, and callers still check the scope of the returned payload.
+        
+        :param self: Represent the instance of the class
+        :param token: str: The encoded token
+        :return: The decoded payload, which must not be modified
+        :doc-author: Trelent
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self.token_cache.get(digest)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            ttl = payload.get("exp", 0) - time.time()
+            if ttl > 0:
+                self.token_cache.set(digest, payload, ttl=ttl)
+        return payload
+
+
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
@@ -108,7 +170,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(refresh_token)
             if payload['scope'] == 'refresh_token':
                 email = payload['sub']
                 return email
@@ -117,6 +179,125 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
 
+    async def _access_payload(self, token: str) -> dict:
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        try:
+            payload = self.decode_token(token)
+        except JWTError:
+            raise credentials_exception
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+            raise credentials_exception
+        if "uid" in payload and payload["iat"] <= self.revoked_users.get(payload["uid"], 0):
+            raise credentials_exception
+        if "jti" in payload and await token_denylist.is_revoked(payload["jti"]):
+            raise credentials_exception
+        return payload
+
+
+    def _revoke_local(self, key: str | None):
+        # A reconnect of the invalidation bus must not forget revocations, so None is ignored here.
+        if key is not None:
+            user_id, _, revoked_before = key.partition(":")
+            self.revoked_users[int(user_id)] = int(revoked_before)
+            if len(self.revoked_users) >= self._prune_revocations_at:
+                self._prune_revocations()
+
+
+    def _prune_revocations(self):
+        # Tokens revoked before now - CLAIMS_TOKEN_TTL have all expired. When every revocation is still in force,
+        # the threshold grows instead, so a burst of revocations is not scanned again on every insert.
+        expired = int(time.time()) - self.CLAIMS_TOKEN_TTL
+        self.revoked_users = {user_id: revoked_before for user_id, revoked_before in self.revoked_users.items()
+                              if revoked_before >= expired}
+        self._prune_revocations_at = max(config.REVOKED_USERS_PRUNE_SIZE, 2 * len(self.revoked_users))
+
+
+    async def revoke_user_tokens(self, user_id: int):
+        """
+        The revoke_user_tokens function revokes every claims token issued to a user until now.
+            The revocation is stored in redis for the lifetime of a claims token and broadcast to all workers,
+            which keep it in memory, so checking it in get_principal costs no network call.
+        
+        :param self: Represent the instance of the class
+        :param user_id: int: The id of the user
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        revoked_before = int(time.time())
+        await self.cache.set(f"revoked:user:{user_id}", revoked_before, ex=self.CLAIMS_TOKEN_TTL)
+        await invalidation_bus.publish("revoke", f"{user_id}:{revoked_before}")
+
+
+    async def load_revocations(self):
+        """
+        The load_revocations function reads the user and token revocations still in force when the worker starts,
+        since revocations published before the worker subscribed to the invalidation bus were never seen.
+        
+        :param self: Represent the instance of the class
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        await token_denylist.load()
+        async for key in self.cache.scan_iter(match="revoked:user:*"):
+            revoked_before = await self.cache.get(key)
+            if revoked_before is not None:
+                self._revoke_local(f"{key.decode().rsplit(':', 1)[1]}:{revoked_before.decode()}")
+
+
+    async def logout(self, token: str):
+        """
+        The logout function revokes an access token until it expires.
+        
+        :param self: Represent the instance of the class
+        :param token: str: The access token to revoke
+        :return: The payload of the revoked token
+        :doc-author: Trelent
+        """
+        payload = await self._access_payload(token)
+        if "jti" in payload:
+            await token_denylist.revoke(payload["jti"], payload["exp"])
+        return payload
+
+
+    async def get_principal(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        The get_principal function is a lightweight alternative to get_current_user for routes that only need
+            the id, email and role of the caller. For claims tokens the principal is built from the signed claims
+            without touching redis or the database; for other tokens it falls back to get_current_user.
+        
+        :param self: Represent the instance of the class
+        :param token: str: Pass the token that is sent in the request
+        :param db: AsyncSession: Get the database session for the fallback
+        :return: A Principal, or the User for tokens without claims
+        :doc-author: Trelent
+        """
+        payload = await self._access_payload(token)
+        if "uid" not in payload:
+            return await self.get_current_user(token, db)
+        role = Role(payload["role"]) if payload["role"] else None
+        return Principal(id=payload["uid"], email=payload["sub"], role=role, confirmed=payload["cnf"])
+
+
+    async def load_user(self, principal: Principal | User, db: AsyncSession):
+        """
+        The load_user function returns the full User behind a principal, for routes that need more than the claims.
+        
+        :param self: Represent the instance of the class
+        :param principal: Principal | User: The authenticated caller
+        :param db: AsyncSession: Get the database session
+        :return: The user object
+        :doc-author: Trelent
+        """
+        if isinstance(principal, User):
+            return principal
+        email = principal.email
+        return await user_cache.get_or_load(email, lambda session: repository_users.get_user_by_email(email, session), db)
+
+
     async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
@@ -129,36 +310,18 @@ class Auth:
         :return: The user object from the database
         :doc-author: Trelent
         """
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        # Decode JWT
+        payload = await self._access_payload(token)
+        email = payload["sub"]
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
-            raise credentials_exception
-
-        user_hash = str(email)
-        
-        user = self.cache.get(user_hash)
+        user = await user_cache.get_or_load(email, lambda session: repository_users.get_user_by_email(email, session), db)
         
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 300)
-        else:
-            user = pickle.loads(user)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         return user
     
 
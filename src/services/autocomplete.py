@@ -0,0 +1,172 @@
+import asyncio
+import uuid
+from bisect import bisect_left, insort
+
+from sqlalchemy import select
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.entity.models import Contact
+from src.services.invalidation import invalidation_bus
+from src.services.lru_cache import LRUCache
+
+
+def contact_terms(first_name: str | None, last_name: str | None, email: str | None) -> set[str]:
+    """
+    The contact_terms function lists the lowercased strings a prefix of which finds the contact:
+    the first name, the last name, the full name and the email.
+
+    :param first_name: str | None: The first name of the contact
+    :param last_name: str | None: The last name of the contact
+    :param email: str | None: The email of the contact
+    :return: A set of terms
+    :doc-author: Trelent
+    """
+    first_name, last_name, email = (first_name or "").casefold(), (last_name or "").casefold(), (email or "").casefold()
+    terms = {first_name, last_name, email, f"{first_name} {last_name}".strip()}
+    terms.discard("")
+    return terms
+
+
+class PrefixIndex:
+    """Contacts of one user: a sorted array of (term, contact id) pairs searched with bisect."""
+
+    __slots__ = ("keys", "contacts")
+
+    def __init__(self, rows=()):
+        self.contacts: dict[int, tuple[str, str, str]] = {}
+        self.keys: list[tuple[str, int]] = []
+        for contact_id, first_name, last_name, email in rows:
+            self.contacts[contact_id] = (first_name, last_name, email)
+            self.keys.extend((term, contact_id) for term in contact_terms(first_name, last_name, email))
+        self.keys.sort()
+
+    def add(self, contact_id: int, first_name: str, last_name: str, email: str):
+        self.remove(contact_id)
+        self.contacts[contact_id] = (first_name, last_name, email)
+        for term in contact_terms(first_name, last_name, email):
+            insort(self.keys, (term, contact_id))
+
+    def remove(self, contact_id: int):
+        fields = self.contacts.pop(contact_id, None)
+        if fields is None:
+            return
+        for term in contact_terms(*fields):
+            i = bisect_left(self.keys, (term, contact_id))
+            if i < len(self.keys) and self.keys[i] == (term, contact_id):
+                del self.keys[i]
+
+    def search(self, prefix: str, limit: int) -> list[dict]:
+        """
+        The search function returns contacts that have a term starting with the prefix,
+        in the order of the matched terms.
+
+        :param self: Represent the instance of the class
+        :param prefix: str: The text typed so far
+        :param limit: int: Limit the number of contacts returned
+        :return: A list of dicts with id, first_name, last_name and email
+        :doc-author: Trelent
+        """
+        prefix = prefix.casefold()
+        found: dict[int, None] = {}
+        for i in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+            term, contact_id = self.keys[i]
+            if not term.startswith(prefix) or len(found) >= limit:
+                break
+            found[contact_id] = None
+        return [{"id": contact_id, "first_name": first_name, "last_name": last_name, "email": email}
+                for contact_id in found for first_name, last_name, email in [self.contacts[contact_id]]]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class AutocompleteIndex:
+    def __init__(self, max_users: int, ttl: float):
+        # Cold users are evicted, and an index is rebuilt at least every ttl seconds
+        # to pick up writes that bypassed the repository.
+        self._indexes = LRUCache(maxsize=max_users, ttl=ttl)
+        self._generations: dict[int, int] = {}
+        self._building: dict[int, asyncio.Future] = {}
+        self._worker = uuid.uuid4().hex
+        self.builds = 0
+        invalidation_bus.subscribe("contacts", self._drop_local)
+
+    def _drop_local(self, key: str | None):
+        if key is None:
+            self._indexes.clear()
+            self._generations.clear()
+            return
+        user_id, _, worker = key.partition(":")
+        if worker != self._worker:
+            self._forget(int(user_id))
+
+    def _forget(self, user_id: int):
+        self._indexes.pop(user_id)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    async def _build(self, user_id: int) -> PrefixIndex:
+        generation = self._generations.get(user_id, 0)
+        stmt = select(Contact.id, Contact.first_name, Contact.last_name, Contact.email).filter_by(user_id=user_id)
+        # The build is shared by concurrent requests and may outlive the one that started it, so it reads
+        # in a session of its own, on the primary: a lagging replica would cache an index missing recent writes.
+        async with sessionmanager.pick_session_maker()() as session:
+            index = PrefixIndex((await session.execute(stmt)).all())
+        self.builds += 1
+        # A write that landed while the rows were read would be missing from this index.
+        if self._generations.get(user_id, 0) == generation:
+            self._indexes.set(user_id, index)
+        return index
+
+    async def search(self, prefix: str, limit: int, user_id: int) -> list[dict]:
+        """
+        The search function answers a typeahead request from the in-memory index of the user.
+        The index is built from the database on first use; concurrent first requests share one build.
+
+        :param self: Represent the instance of the class
+        :param prefix: str: The text typed so far
+        :param limit: int: Limit the number of contacts returned
+        :param user_id: int: The owner of the contacts
+        :return: A list of dicts with id, first_name, last_name and email
+        :doc-author: Trelent
+        """
+        index = self._indexes.get(user_id)
+        if index is None:
+            building = self._building.get(user_id)
+            if building is None:
+                building = asyncio.ensure_future(self._build(user_id))
+                self._building[user_id] = building
+                building.add_done_callback(lambda _: self._building.pop(user_id, None))
+            index = await asyncio.shield(building)
+        return index.search(prefix, limit)
+
+    async def changed(self, user_id: int, contact: Contact | None = None, deleted_id: int | None = None):
+        """
+        The changed function applies a contact write to the local index of the user, if it is loaded,
+        and tells the other workers to drop theirs.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The owner of the contact
+        :param contact: Contact | None: The created or updated contact
+        :param deleted_id: int | None: The id of the deleted contact
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        index = self._indexes.get(user_id)
+        if index is not None:
+            if contact is not None:
+                index.add(contact.id, contact.first_name, contact.last_name, contact.email)
+            if deleted_id is not None:
+                index.remove(deleted_id)
+        await invalidation_bus.publish("contacts", f"{user_id}:{self._worker}")
+
+    async def invalidate(self, user_id: int):
+        self._forget(user_id)
+        await invalidation_bus.publish("contacts", f"{user_id}:{self._worker}")
+
+    def stats(self) -> dict:
+        return {**self._indexes.stats(), "builds": self.builds}
+
+
+autocomplete_index = AutocompleteIndex(config.AUTOCOMPLETE_MAX_USERS, config.AUTOCOMPLETE_TTL)
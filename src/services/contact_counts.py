@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.cache import redis_manager
+from src.database.db import sessionmanager
+from src.entity.models import Contact
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] - counter; ARGV[1] - delta. A missing counter stays missing: it is seeded from the database on read.
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+class ContactCounter:
+    TTL = 7 * 24 * 3600
+    RECONCILE_BATCH = 500
+
+    def __init__(self, cap: int, cache_ttl: int, reconcile_interval: int):
+        self.cap = cap
+        self.cache_ttl = cache_ttl
+        self.reconcile_interval = reconcile_interval
+        self._incr = None
+        self._task: asyncio.Task | None = None
+
+    def key(self, user_id: int) -> str:
+        return f"contacts:count:{user_id}"
+
+    def filtered_key(self, user_id: int, criteria: dict) -> str:
+        digest = hashlib.sha1(json.dumps(criteria, sort_keys=True).encode()).hexdigest()
+        return f"contacts:count-filtered:{user_id}:{digest}"
+
+    async def total(self, db: AsyncSession, user_id: int, criteria: dict | None = None) -> tuple[int, bool]:
+        """
+        The total function returns the number of contacts of a user for the X-Total-Count header.
+        Without criteria it reads the per-user counter kept up to date by the contact writes,
+        counting the rows once when the counter is missing. With criteria the count is capped at
+        cap rows and cached for cache_ttl seconds.
+
+        :param self: Represent the instance of the class
+        :param db: AsyncSession: Count in the database on a cache miss
+        :param user_id: int: The owner of the contacts
+        :param criteria: dict | None: The filters of the listing
+        :return: The count and whether it was capped
+        :doc-author: Trelent
+        """
+        key = self.filtered_key(user_id, criteria) if criteria else self.key(user_id)
+        cached = await redis_manager.client.get(key)
+        if cached is not None:
+            count = int(cached)
+            return count, bool(criteria) and count >= self.cap
+        stmt = select(Contact.id).filter_by(**(criteria or {}), user_id=user_id)
+        if criteria:
+            stmt = stmt.limit(self.cap)
+        count = (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar_one()
+        if criteria:
+            await redis_manager.client.set(key, count, ex=self.cache_ttl)
+            return count, count >= self.cap
+        await redis_manager.client.set(key, count, ex=self.TTL, nx=True)
+        return count, False
+
+    async def total_all(self, db: AsyncSession) -> tuple[int, bool]:
+        """
+        The total_all function returns the number of contacts of all users for the X-Total-Count header
+        of the admin listing. Like filtered counts, it is capped at cap rows and cached for cache_ttl seconds.
+
+        :param self: Represent the instance of the class
+        :param db: AsyncSession: Count in the database on a cache miss
+        :return: The count and whether it was capped
+        :doc-author: Trelent
+        """
+        key = "contacts:count-all"
+        cached = await redis_manager.client.get(key)
+        if cached is None:
+            stmt = select(Contact.id).limit(self.cap)
+            count = (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar_one()
+            await redis_manager.client.set(key, count, ex=self.cache_ttl)
+        else:
+            count = int(cached)
+        return count, count >= self.cap
+
+    async def changed(self, user_id: int, delta: int):
+        if self._incr is None:
+            self._incr = redis_manager.client.register_script(INCR_IF_EXISTS_SCRIPT)
+        await self._incr(keys=[self.key(user_id)], args=[delta])
+
+    async def invalidate(self, user_id: int):
+        await redis_manager.client.delete(self.key(user_id))
+
+    async def reconcile(self, db: AsyncSession) -> int:
+        """
+        The reconcile function recounts the contacts of every user that has a counter and overwrites
+        counters that drifted, e.g. after a write that failed between the commit and the increment.
+
+        :param self: Represent the instance of the class
+        :param db: AsyncSession: Pass the database session to the function
+        :return: The number of corrected counters
+        :doc-author: Trelent
+        """
+        fixed = 0
+        keys = [key async for key in redis_manager.client.scan_iter(match=self.key("*"), count=self.RECONCILE_BATCH)]
+        for start in range(0, len(keys), self.RECONCILE_BATCH):
+            batch = keys[start:start + self.RECONCILE_BATCH]
+            user_ids = [int(key.decode().rsplit(":", 1)[1]) for key in batch]
+            stmt = select(Contact.user_id, func.count()).where(Contact.user_id.in_(user_ids)).group_by(Contact.user_id)
+            counts = dict((await db.execute(stmt)).all())
+            cached = await redis_manager.client.mget(batch)
+            async with redis_manager.client.pipeline(transaction=False) as pipe:
+                for key, user_id, value in zip(batch, user_ids, cached):
+                    if value is not None and int(value) != counts.get(user_id, 0):
+                        pipe.set(key, counts.get(user_id, 0), ex=self.TTL, xx=True)
+                        fixed += 1
+                await pipe.execute()
+        return fixed
+
+    async def run_reconciliation(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                # One worker per interval does the work.
+                if await redis_manager.client.set("contacts:count:reconcile", 1, ex=self.reconcile_interval, nx=True):
+                    async with sessionmanager.session() as db:
+                        fixed = await self.reconcile(db)
+                    if fixed:
+                        logger.info("Contact counters reconciled: %d fixed", fixed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("Contact counter reconciliation failed: %r", err)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_reconciliation())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+contact_counter = ContactCounter(config.CONTACT_COUNT_CAP, config.CONTACT_COUNT_CACHE_TTL,
+                                 config.CONTACT_COUNT_RECONCILE_INTERVAL)
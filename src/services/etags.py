@@ -0,0 +1,100 @@
+import hashlib
+import time
+from datetime import datetime
+
+from src.database.cache import redis_manager
+
+
+# KEYS[1] - version. A missing version is seeded from the clock on read, so it never goes back to a value seen before.
+BUMP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+return false
+"""
+
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=12).hexdigest() + '"'
+
+
+def contact_etag(contact_id: int, updated_at: datetime | None, owner_updated_at: datetime | None) -> str:
+    """
+    The contact_etag function makes the strong ETag of a single contact from its id and updated_at.
+    The owner is a part of the representation, so its updated_at is included too.
+
+    :param contact_id: int: The id of the contact
+    :param updated_at: datetime | None: When the contact was changed
+    :param owner_updated_at: datetime | None: When the owner was changed
+    :return: A quoted ETag
+    :doc-author: Trelent
+    """
+    return make_etag("contact", contact_id, updated_at, owner_updated_at)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function compares the If-None-Match header of a request with the current ETag.
+    As RFC 9110 requires for If-None-Match, the comparison is weak: W/ prefixes are ignored.
+
+    :param if_none_match: str | None: The header value, e.g. '"a", W/"b"' or '*'
+    :param etag: str: The current ETag
+    :return: True if the client has the current representation
+    :doc-author: Trelent
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+class CollectionVersions:
+    TTL = 7 * 24 * 3600
+
+    def __init__(self):
+        self._bump = None
+
+    def key(self, user_id: int) -> str:
+        return f"contacts:version:{user_id}"
+
+    async def get(self, user_id: int) -> int:
+        """
+        The get function returns the version of the contacts of a user, with a single GET when it exists.
+        A missing version is seeded with the current time in nanoseconds.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The owner of the contacts
+        :return: The version
+        :doc-author: Trelent
+        """
+        version = await redis_manager.client.get(self.key(user_id))
+        if version is not None:
+            return int(version)
+        version = time.time_ns()
+        if not await redis_manager.client.set(self.key(user_id), version, ex=self.TTL, nx=True):
+            version = await redis_manager.client.get(self.key(user_id)) or version
+        return int(version)
+
+    async def bump(self, user_id: int):
+        if self._bump is None:
+            self._bump = redis_manager.client.register_script(BUMP_SCRIPT)
+        await self._bump(keys=[self.key(user_id)])
+
+    async def list_etag(self, user_id: int, *query) -> str:
+        """
+        The list_etag function makes the strong ETag of a listing from the version of the user's contacts
+        and everything that selects the page, e.g. the path, filters, sort and cursor.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The owner of the contacts
+        :param query: Whatever selects the page
+        :return: A quoted ETag
+        :doc-author: Trelent
+        """
+        return make_etag("contacts", user_id, await self.get(user_id), *query)
+
+
+contact_versions = CollectionVersions()
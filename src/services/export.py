@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable
+
+from src.entity.models import Contact
+
+CSV_FIELDS = ["id", "first_name", "last_name", "email", "phone_number", "birth_date", "additional_data",
+              "created_at", "updated_at"]
+FLUSH_SIZE = 64 * 1024
+
+
+def contact_fields(contact: Contact) -> dict:
+    return {name: getattr(contact, name) for name in CSV_FIELDS}
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_FIELDS)
+    return buffer.getvalue()
+
+
+def to_csv(contact: Contact) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in contact_fields(contact).values()])
+    return buffer.getvalue()
+
+
+def to_ndjson(contact: Contact) -> str:
+    return json.dumps(contact_fields(contact), default=lambda value: value.isoformat(), ensure_ascii=False) + "\n"
+
+
+def vcard_escape(value: str | None) -> str:
+    return (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n") \
+        .replace("\n", "\\n")
+
+
+def vcard_fold(line: str) -> str:
+    """
+    The vcard_fold function folds a content line longer than 75 octets as RFC 6350 requires:
+    the continuation lines start with a space. UTF-8 sequences are never split.
+
+    :param line: str: An unfolded content line
+    :return: The folded line, terminated with CRLF
+    :doc-author: Trelent
+    """
+    parts, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            parts.append(current)
+            current, size = " ", 1
+        current += char
+        size += width
+    parts.append(current)
+    return "\r\n".join(parts) + "\r\n"
+
+
+def to_vcard(contact: Contact) -> str:
+    first_name, last_name = vcard_escape(contact.first_name), vcard_escape(contact.last_name)
+    lines = ["BEGIN:VCARD", "VERSION:3.0", f"UID:contact-{contact.id}", f"N:{last_name};{first_name};;;",
+             f"FN:{' '.join(name for name in (first_name, last_name) if name)}",
+             f"EMAIL;TYPE=INTERNET:{vcard_escape(contact.email)}", f"TEL:{vcard_escape(contact.phone_number)}"]
+    if contact.birth_date:
+        lines.append(f"BDAY:{contact.birth_date.isoformat()}")
+    if contact.additional_data:
+        lines.append(f"NOTE:{vcard_escape(contact.additional_data)}")
+    lines.append("END:VCARD")
+    return "".join(vcard_fold(line) for line in lines)
+
+
+# format -> (media type, file extension, header, row serializer)
+EXPORT_FORMATS: dict[str, tuple[str, str, Callable[[], str] | None, Callable[[Contact], str]]] = {
+    "csv": ("text/csv; charset=utf-8", "csv", csv_header, to_csv),
+    "ndjson": ("application/x-ndjson", "ndjson", None, to_ndjson),
+    "vcf": ("text/vcard; charset=utf-8", "vcf", None, to_vcard),
+}
+
+
+async def export_chunks(contacts: AsyncIterator[Contact], fmt: str) -> AsyncIterator[bytes]:
+    """
+    The export_chunks function serializes contacts as they arrive from the database.
+    The header and the first row are sent right away, later rows are grouped into chunks of about
+    FLUSH_SIZE bytes, so memory does not depend on the number of contacts.
+
+    :param contacts: AsyncIterator[Contact]: Contacts streamed from the database
+    :param fmt: str: One of EXPORT_FORMATS
+    :return: An async iterator over encoded chunks
+    :doc-author: Trelent
+    """
+    _, _, header, serialize = EXPORT_FORMATS[fmt]
+    if header is not None:
+        yield header().encode()
+    parts, size, first = [], 0, True
+    async for contact in contacts:
+        row = serialize(contact)
+        if first:
+            yield row.encode()
+            first = False
+            continue
+        parts.append(row)
+        size += len(row)
+        if size >= FLUSH_SIZE:
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode()
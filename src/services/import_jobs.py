@@ -0,0 +1,287 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import date
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator
+
+from fastapi import UploadFile
+
+from src.conf.config import config
+from src.database.cache import redis_manager
+from src.database.db import sessionmanager
+from src.repository import contacts as repository_contacts
+from src.services.json_stream import iter_json_items
+
+IMPORT_FORMATS = {".csv": "csv", ".vcf": "vcf", ".vcard": "vcf", ".json": "json", ".ndjson": "json", ".jsonl": "json"}
+CONTACT_FIELDS = ("first_name", "last_name", "email", "phone_number", "birth_date", "additional_data")
+READ_SIZE = 64 * 1024
+
+
+def import_format(filename: str | None) -> str | None:
+    return IMPORT_FORMATS.get(Path(filename or "").suffix.lower())
+
+
+def csv_rows(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    The csv_rows function reads contacts from a CSV file with a header row, e.g. one made by the export.
+    Unknown columns are ignored and an empty birth_date means no birth date.
+
+    :param lines: Iterable[str]: The lines of the file
+    :return: An iterator over dicts with the ContactModel fields
+    :doc-author: Trelent
+    """
+    for row in csv.DictReader(lines):
+        contact = {name: row[name] for name in CONTACT_FIELDS if row.get(name) is not None}
+        if not contact.get("birth_date"):
+            contact.pop("birth_date", None)
+        yield contact
+
+
+def vcard_unescape(value: str) -> str:
+    result, chars = [], iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            result.append("\n" if char in "nN" else char)
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def vcard_split(value: str, separator: str) -> list[str]:
+    parts, current, chars = [], [], iter(value)
+    for char in chars:
+        if char == "\\":
+            current.append(char + next(chars, ""))
+        elif char == separator:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [vcard_unescape(part) for part in parts]
+
+
+def vcard_birthday(value: str) -> str | None:
+    value = value.strip()
+    if len(value) == 8 and value.isdigit():
+        value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError:
+        # e.g. --0301, a birthday without a year
+        return None
+
+
+def vcard_rows(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    The vcard_rows function reads contacts from a vCard 3.0/4.0 file: the name (N, or FN as a fallback),
+    the first EMAIL and TEL, BDAY and NOTE of every card. Folded lines are unfolded first.
+
+    :param lines: Iterable[str]: The lines of the file
+    :return: An iterator over dicts with the ContactModel fields
+    :doc-author: Trelent
+    """
+    def logical_lines():
+        current = None
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and current is not None:
+                current += line[1:]
+                continue
+            if current is not None:
+                yield current
+            current = line
+        if current is not None:
+            yield current
+
+    card = None
+    for line in logical_lines():
+        name, _, value = line.partition(":")
+        name = name.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {"first_name": "", "last_name": "", "phone_number": "", "additional_data": ""}
+        elif card is None:
+            continue
+        elif name == "END":
+            yield card
+            card = None
+        elif name == "N":
+            last_name, first_name = (vcard_split(value, ";") + ["", ""])[:2]
+            card["first_name"], card["last_name"] = first_name or card["first_name"], last_name
+        elif name == "FN" and not card["first_name"]:
+            card["first_name"] = vcard_unescape(value)
+        elif name == "EMAIL" and "email" not in card:
+            card["email"] = vcard_unescape(value).strip()
+        elif name == "TEL" and not card["phone_number"]:
+            card["phone_number"] = vcard_unescape(value).strip().removeprefix("tel:")
+        elif name == "BDAY":
+            card["birth_date"] = vcard_birthday(value)
+        elif name == "NOTE":
+            card["additional_data"] = vcard_unescape(value)
+
+
+async def iter_in_thread(iterator: Iterator, batch_size: int = 1000) -> AsyncIterator:
+    """
+    The iter_in_thread function consumes a blocking iterator (file reads and parsing) in a worker thread,
+    batch_size items at a time, so the event loop keeps serving requests during an import.
+
+    :param iterator: Iterator: A blocking iterator
+    :param batch_size: int: Number of items taken from the iterator per thread hop
+    :return: An async iterator over the same items
+    :doc-author: Trelent
+    """
+    while True:
+        batch = await asyncio.to_thread(list, islice(iterator, batch_size))
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+async def read_contact_file(path: str, fmt: str) -> AsyncIterator:
+    if fmt == "json":
+        with open(path, "rb") as file:
+            async for item in iter_json_items(iter_in_thread(iter(lambda: file.read(READ_SIZE), b""), 1)):
+                yield item
+        return
+    parse = csv_rows if fmt == "csv" else vcard_rows
+    with open(path, encoding="utf-8-sig", newline="" if fmt == "csv" else None) as file:
+        async for item in iter_in_thread(parse(file)):
+            yield item
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> str:
+    """
+    The spool_upload function copies an uploaded file to a temporary file that outlives the request.
+
+    :param file: UploadFile: The uploaded file
+    :param max_bytes: int: The largest accepted upload
+    :return: The path of the temporary file
+    :doc-author: Trelent
+    """
+    spool = tempfile.NamedTemporaryFile(prefix="import-", dir=config.IMPORT_SPOOL_DIR, delete=False)
+    size = 0
+    try:
+        while chunk := await file.read(READ_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError("File is too large")
+            await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        spool.close()
+        os.remove(spool.name)
+        raise
+    spool.close()
+    return spool.name
+
+
+class ImportJobs:
+    MAX_ERRORS = 100
+    STATUSES = ("created", "updated", "upserted", "invalid", "conflict", "failed")
+
+    def key(self, job_id: str) -> str:
+        return f"import:job:{job_id}"
+
+    def errors_key(self, job_id: str) -> str:
+        return f"import:job:{job_id}:errors"
+
+    async def create(self, user_id: int, filename: str, fmt: str) -> str:
+        job_id = uuid.uuid4().hex
+        job = {"user_id": user_id, "status": "queued", "format": fmt, "filename": filename,
+               "processed": 0, "created_at": time.time(), **{status: 0 for status in self.STATUSES}}
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key(job_id), mapping=job)
+            pipe.expire(self.key(job_id), config.IMPORT_JOB_TTL)
+            await pipe.execute()
+        return job_id
+
+    async def get(self, job_id: str) -> dict | None:
+        """
+        The get function reads the status and progress of an import job.
+
+        :param self: Represent the instance of the class
+        :param job_id: str: The id of the job
+        :return: A dict with the job fields and the first MAX_ERRORS row errors, or None if there is no such job
+        :doc-author: Trelent
+        """
+        async with redis_manager.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self.key(job_id))
+            pipe.lrange(self.errors_key(job_id), 0, -1)
+            fields, errors = await pipe.execute()
+        if not fields:
+            return None
+        job = {key.decode(): value.decode() for key, value in fields.items()}
+        for name in ("user_id", "processed", *self.STATUSES):
+            job[name] = int(job[name])
+        for name in ("rows_per_sec", "created_at", "started_at", "finished_at"):
+            if name in job:
+                job[name] = float(job[name])
+        job["job_id"] = job_id
+        job["errors"] = [json.loads(error) for error in errors]
+        return job
+
+    async def _update(self, job_id: str, counts: dict | None = None, errors: list | None = None, **fields):
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            for name, count in (counts or {}).items():
+                pipe.hincrby(self.key(job_id), name, count)
+            if fields:
+                pipe.hset(self.key(job_id), mapping=fields)
+            if errors:
+                pipe.rpush(self.errors_key(job_id), *(json.dumps(error) for error in errors))
+                pipe.ltrim(self.errors_key(job_id), 0, self.MAX_ERRORS - 1)
+                pipe.expire(self.errors_key(job_id), config.IMPORT_JOB_TTL)
+            pipe.expire(self.key(job_id), config.IMPORT_JOB_TTL)
+            await pipe.execute()
+
+    async def run(self, job_id: str, path: str, fmt: str, user):
+        """
+        The run function processes a spooled import file: it parses the file in streaming chunks,
+        writes the contacts in batches with upsert_contacts_in_batches and records the progress
+        after every batch. The file is removed at the end.
+
+        :param self: Represent the instance of the class
+        :param job_id: str: The id of the job
+        :param path: str: The spooled file
+        :param fmt: str: csv, vcf or json
+        :param user: The owner of the contacts
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        started, processed, error_count = time.monotonic(), 0, 0
+        try:
+            await self._update(job_id, status="running", started_at=time.time())
+            async with sessionmanager.session() as db:
+                try:
+                    batches = repository_contacts.upsert_contacts_in_batches(read_contact_file(path, fmt), db, user,
+                                                                             config.BULK_CHUNK_SIZE)
+                    async for results in batches:
+                        counts = {"processed": len(results)}
+                        for result in results:
+                            counts[result["status"]] = counts.get(result["status"], 0) + 1
+                        errors = [result for result in results if "error" in result][:self.MAX_ERRORS - error_count]
+                        processed += len(results)
+                        error_count += len(errors)
+                        await self._update(job_id, counts, errors,
+                                           rows_per_sec=round(processed / (time.monotonic() - started), 1))
+                except Exception as err:
+                    print(err)
+                    await self._update(job_id, status="failed", error=f"{type(err).__name__}: {err}"[:500],
+                                       finished_at=time.time())
+                    return
+            await self._update(job_id, status="done", finished_at=time.time(),
+                               rows_per_sec=round(processed / (time.monotonic() - started), 1))
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+import_jobs = ImportJobs()
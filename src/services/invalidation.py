@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Callable
+
+from src.database.cache import redis_manager
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    CHANNEL = "cache:invalidate"
+
+    def __init__(self):
+        self._handlers: dict[str, list[Callable[[str | None], None]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, topic: str, handler: Callable[[str | None], None]):
+        """
+        The subscribe function registers a handler for invalidations of one topic.
+        The handler receives the invalidated key, or None when every local entry must be dropped
+        (for example after the worker lost its pub/sub connection and may have missed messages).
+
+        :param self: Represent the instance of the class
+        :param topic: str: Name of the cache, e.g. user
+        :param handler: Callable[[str | None], None]: Drops local entries
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _dispatch(self, topic: str, key: str | None):
+        for handler in self._handlers.get(topic, []):
+            handler(key)
+
+    async def publish(self, topic: str, key: str):
+        """
+        The publish function drops the key in this worker right away and broadcasts it to the others.
+
+        :param self: Represent the instance of the class
+        :param topic: str: Name of the cache
+        :param key: str: The invalidated key
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        self._dispatch(topic, key)
+        await redis_manager.client.publish(self.CHANNEL, f"{topic}:{key}")
+
+    def _clear_all(self):
+        for topic in self._handlers:
+            self._dispatch(topic, None)
+
+    async def listen(self):
+        """
+        The listen function applies the invalidations broadcast by the other workers until it is cancelled.
+        Messages published while the worker is not subscribed are lost, so every local entry is dropped
+        once the subscription is (re)established, as well as when the connection fails.
+
+        :param self: Represent the instance of the class
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        while True:
+            pubsub = redis_manager.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                self._clear_all()
+                async for message in pubsub.listen():
+                    topic, _, key = message["data"].decode().partition(":")
+                    self._dispatch(topic, key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("Cache invalidation channel lost, resubscribing: %r", err)
+                self._clear_all()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+invalidation_bus = InvalidationBus()
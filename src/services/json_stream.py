@@ -0,0 +1,108 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+MAX_ITEM_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+async def iter_json_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    The iter_json_items function parses a request body incrementally, item by item,
+    so the memory used does not depend on the size of the body.
+    A body starting with [ is read as a JSON array, anything else as NDJSON (one JSON document per line).
+    A malformed NDJSON line is yielded as a JSONStreamError and the next lines are still read;
+    a malformed array can not be resynchronized, so the error is raised.
+
+    :param chunks: AsyncIterator[bytes]: The body, e.g. request.stream()
+    :return: An async iterator over the parsed items
+    :doc-author: Trelent
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    mode = None
+    pos = 0
+    expect_comma = False
+    done = False
+    final = False
+    chunks = aiter(chunks)
+
+    while not final:
+        try:
+            buffer = buffer[pos:] + text.decode(await anext(chunks))
+        except StopAsyncIteration:
+            buffer = buffer[pos:] + text.decode(b"", final=True)
+            final = True
+        except UnicodeDecodeError as err:
+            raise JSONStreamError(f"Body is not valid UTF-8: {err}") from err
+        pos = 0
+
+        if mode is None:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                buffer = ""
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+
+        if mode == "ndjson":
+            while True:
+                end = buffer.find("\n", pos)
+                if end < 0:
+                    if final:
+                        end = len(buffer)
+                    else:
+                        break
+                line = buffer[pos:end].strip()
+                pos = end + 1
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError as err:
+                        yield JSONStreamError(str(err))
+                if pos > len(buffer):
+                    break
+            if len(buffer) - pos > MAX_ITEM_SIZE:
+                raise JSONStreamError("Line is too long")
+            continue
+
+        while not done:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                done = True
+                pos += 1
+                break
+            if expect_comma:
+                if buffer[pos] != ",":
+                    raise JSONStreamError(f"Expected ',' or ']' in the array, got {buffer[pos]!r}")
+                pos += 1
+                expect_comma = False
+                continue
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except ValueError as err:
+                if final:
+                    raise JSONStreamError(str(err)) from err
+                break
+            if end == len(buffer) and not final:
+                # A number or literal at the end of the buffer may continue in the next chunk.
+                break
+            yield item
+            pos = end
+            expect_comma = True
+        if done and buffer[pos:].strip(_WHITESPACE):
+            raise JSONStreamError("Extra data after the array")
+        if len(buffer) - pos > MAX_ITEM_SIZE:
+            raise JSONStreamError("Array item is too large")
+
+    if mode == "array" and not done:
+        raise JSONStreamError("Unterminated array")
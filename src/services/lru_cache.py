@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        The get function returns a live entry and marks it as recently used.
+        Expired entries are removed on access and counted as a miss.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: The key to look up
+        :param default: Any: Returned when the key is missing or expired
+        :return: The cached value or default
+        :doc-author: Trelent
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        The set function stores a value and evicts the least recently used entries above maxsize.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: The key to store
+        :param value: Any: The value to store
+        :param ttl: float | None: Lifetime of the entry in seconds, the cache ttl by default
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf import messages
+from src.conf.config import config
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    def __init__(self, executor: str, workers: int, max_pending: int):
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, func, *args):
+        """
+        The run function executes a bcrypt call in the dedicated executor instead of on the event loop.
+        At most max_pending calls may be queued or running at once; further calls are rejected
+        with 503, so a burst of logins can not starve the rest of the API.
+
+        :param self: Represent the instance of the class
+        :param func: Module level function to call, it must be picklable for the process pool
+        :param args: Arguments of func
+        :return: The result of func
+        :doc-author: Trelent
+        """
+        if self._pending >= self.max_pending:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=messages.TOO_MANY_PASSWORD_CHECKS, headers={"Retry-After": "1"})
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(config.PASSWORD_HASH_EXECUTOR, config.PASSWORD_HASH_WORKERS,
+                                 config.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,19 @@
+from fastapi import Depends
+
+from src.database.db import sessionmanager
+from src.entity.models import User
+from src.services.auth import auth_service, Principal
+
+
+async def get_read_db(user: Principal | User = Depends(auth_service.get_principal)):
+    """
+    The get_read_db function is the read-only counterpart of get_db: the session is opened on a healthy
+    read replica, or on the primary when there is none or the user wrote within the read-your-writes window.
+    Endpoints that write must keep using get_db.
+
+    :param user: User: The current user
+    :return: A database session
+    :doc-author: Trelent
+    """
+    async with sessionmanager.read_session(await sessionmanager.wrote_recently(user.id)) as session:
+        yield session
@@ -0,0 +1,164 @@
+import time
+import uuid
+
+from src.database.cache import redis_manager
+
+
+ROTATED = 1
+UNKNOWN = 0
+REUSED = -1
+
+# KEYS[1] - family hash, ARGV[1] - presented jti, ARGV[2] - new jti, ARGV[3] - ttl
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'jti')
+if not current then
+    return {0}
+end
+if current ~= ARGV[1] then
+    local uid = redis.call('HGET', KEYS[1], 'uid')
+    redis.call('DEL', KEYS[1])
+    return {-1, 'uid', uid}
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local result = redis.call('HGETALL', KEYS[1])
+table.insert(result, 1, 1)
+return result
+"""
+
+
+# KEYS - family hashes of a user, ARGV[1] - role, ARGV[2] - confirmed, ARGV[3] - time of the claims
+UPDATE_CLAIMS_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('HSET', key, 'role', ARGV[1], 'cnf', ARGV[2], 'claims_at', ARGV[3])
+    end
+end
+return 0
+"""
+
+
+def claims(role, confirmed: bool) -> dict:
+    return {"role": role.value if role else "", "cnf": int(bool(confirmed)), "claims_at": int(time.time())}
+
+
+class RefreshTokenStore:
+    def __init__(self):
+        self._rotate = None
+        self._update_claims = None
+
+    def family_key(self, family: str) -> str:
+        return f"refresh:family:{family}"
+
+    def user_key(self, user_id: int) -> str:
+        return f"refresh:user:{user_id}"
+
+    async def start(self, user, device: str | None, ttl: int) -> tuple[str, str]:
+        """
+        The start function opens a new token family (one login session on one device).
+        The family keeps the claims needed to issue access tokens, so refreshing reads the users table
+        only when the claims are older than AUTH_CLAIMS_MAX_AGE.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user who logged in
+        :param device: str | None: A label of the device, e.g. the client id or user agent
+        :param ttl: int: Lifetime of the refresh token in seconds
+        :return: The family id and the jti of its first refresh token
+        :doc-author: Trelent
+        """
+        family, jti = uuid.uuid4().hex, uuid.uuid4().hex
+        session = {
+            "sub": user.email,
+            "uid": user.id,
+            **claims(user.role, user.confirmed),
+            "jti": jti,
+            "device": device or "",
+            "created": int(time.time()),
+        }
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.family_key(family), mapping=session)
+            pipe.expire(self.family_key(family), ttl)
+            pipe.sadd(self.user_key(user.id), family)
+            pipe.expire(self.user_key(user.id), ttl)
+            await pipe.execute()
+        return family, jti
+
+    async def rotate(self, family: str, jti: str, ttl: int) -> tuple[int, dict, str | None]:
+        """
+        The rotate function atomically replaces the current refresh token of a family with a new one.
+        Presenting a refresh token that was already rotated away means it leaked, so the whole family is revoked.
+
+        :param self: Represent the instance of the class
+        :param family: str: The family id from the refresh token
+        :param jti: str: The jti from the refresh token
+        :param ttl: int: Lifetime of the new refresh token in seconds
+        :return: ROTATED, REUSED or UNKNOWN, the session data and the new jti
+        :doc-author: Trelent
+        """
+        if self._rotate is None:
+            self._rotate = redis_manager.client.register_script(ROTATE_SCRIPT)
+        new_jti = uuid.uuid4().hex
+        result = await self._rotate(keys=[self.family_key(family)], args=[jti, new_jti, ttl])
+        status = int(result[0])
+        session = {k.decode(): v.decode() for k, v in zip(result[1::2], result[2::2]) if v is not None}
+        if status == REUSED and session.get("uid"):
+            await redis_manager.client.srem(self.user_key(int(session["uid"])), family)
+        if status == ROTATED:
+            await redis_manager.client.expire(self.user_key(int(session["uid"])), ttl)
+        return status, session, new_jti if status == ROTATED else None
+
+    async def update_claims(self, user_id: int, role, confirmed: bool):
+        """
+        The update_claims function writes the current role and confirmation of a user into all of their
+        token families, so the access tokens issued by the next refreshes carry them.
+        Families that expired are not recreated.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The id of the user
+        :param role: Role | None: The role of the user
+        :param confirmed: bool: Whether the email of the user is confirmed
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        families = await redis_manager.client.smembers(self.user_key(user_id))
+        if not families:
+            return
+        if self._update_claims is None:
+            self._update_claims = redis_manager.client.register_script(UPDATE_CLAIMS_SCRIPT)
+        values = claims(role, confirmed)
+        await self._update_claims(keys=[self.family_key(family.decode()) for family in families],
+                                  args=[values["role"], values["cnf"], values["claims_at"]])
+
+    async def revoke(self, user_id: int, family: str):
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.family_key(family))
+            pipe.srem(self.user_key(user_id), family)
+            await pipe.execute()
+
+    async def sessions(self, user_id: int) -> list[dict]:
+        """
+        The sessions function lists the active login sessions of a user, one per token family.
+        Families that already expired are removed from the user's index.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The id of the user
+        :return: A list of dicts with family, device and created
+        :doc-author: Trelent
+        """
+        families = [f.decode() for f in await redis_manager.client.smembers(self.user_key(user_id))]
+        async with redis_manager.client.pipeline(transaction=False) as pipe:
+            for family in families:
+                pipe.hmget(self.family_key(family), "device", "created")
+            rows = await pipe.execute() if families else []
+        result, expired = [], []
+        for family, (device, created) in zip(families, rows):
+            if created is None:
+                expired.append(family)
+                continue
+            result.append({"family": family, "device": device.decode(), "created": int(created)})
+        if expired:
+            await redis_manager.client.srem(self.user_key(user_id), *expired)
+        return result
+
+
+refresh_token_store = RefreshTokenStore()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from src.conf.config import config
+from src.database.cache import redis_manager
+from src.services.bloom import BloomFilter
+from src.services.invalidation import invalidation_bus
+
+
+class TokenDenylist:
+    def __init__(self, capacity: int, error_rate: float, rotate_every: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate_every = rotate_every
+        # Bloom filters can not forget, so revoked ids are kept in two generations and the older one is
+        # dropped every rotate_every seconds. An id stays in memory at least that long, which covers
+        # the remaining life of any access token.
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+        invalidation_bus.subscribe("jti", self._add_local)
+
+    def key(self, jti: str) -> str:
+        return f"revoked:jti:{jti}"
+
+    def _rotate(self):
+        if time.monotonic() - self._rotated_at >= self.rotate_every:
+            self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = time.monotonic()
+
+    def _add_local(self, jti: str | None):
+        if jti is None:
+            # The bus reconnected and may have missed revocations: reload them from redis.
+            asyncio.get_running_loop().create_task(self.load())
+            return
+        self._rotate()
+        self._current.add(jti)
+
+    async def revoke(self, jti: str, expires_at: float):
+        """
+        The revoke function puts a token id on the denylist until the token expires.
+
+        :param self: Represent the instance of the class
+        :param jti: str: The jti claim of the token
+        :param expires_at: float: The exp claim of the token
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        ttl = int(expires_at - time.time()) + 1
+        if ttl <= 0:
+            return
+        await redis_manager.client.set(self.key(jti), 1, ex=ttl)
+        await invalidation_bus.publish("jti", jti)
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        The is_revoked function checks a token id against the denylist.
+        The local Bloom filter answers the common case of a token that was never revoked without a network call;
+        only a filter hit, which may be a false positive, is confirmed in redis.
+
+        :param self: Represent the instance of the class
+        :param jti: str: The jti claim of the token
+        :return: True if the token was revoked
+        :doc-author: Trelent
+        """
+        self._rotate()
+        if jti not in self._current and jti not in self._previous:
+            return False
+        return bool(await redis_manager.client.exists(self.key(jti)))
+
+    async def load(self):
+        async for key in redis_manager.client.scan_iter(match=self.key("*"), count=1000):
+            self._current.add(key.decode().rsplit(":", 1)[1])
+
+
+token_denylist = TokenDenylist(config.TOKEN_DENYLIST_CAPACITY, config.TOKEN_DENYLIST_ERROR_RATE, rotate_every=config.ACCESS_TOKEN_TTL)
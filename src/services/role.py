@@ -1,7 +1,7 @@
 from fastapi import Request, Depends, HTTPException, status
 
 from src.entity.models import Role, User
-from src.services.auth import auth_service
+from src.services.auth import auth_service, Principal
 
 
 class RoleAccess:
@@ -9,7 +9,7 @@ class RoleAccess:
         self.allowed_roles = allowed_roles
 
 
-    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
+    async def __call__(self, request: Request, user: Principal | User = Depends(auth_service.get_principal)):
         print(user.role, self.allowed_roles)
         if user.role not in self.allowed_roles:
                 raise HTTPException(
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import uuid
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import config
+from src.database.cache import redis_manager
+from src.database.db import sessionmanager
+from src.entity.models import Role, User
+from src.services.invalidation import invalidation_bus
+from src.services.lru_cache import LRUCache
+
+
+# KEYS[1] - lock key, ARGV[1] - lock owner
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS[1] - snapshot key, KEYS[2] - generation key, ARGV[1] - snapshot, ARGV[2] - TTL,
+# ARGV[3] - generation seen before the snapshot was read from the database
+SET_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+class UserCache:
+    VERSION = 1
+    TTL = 300
+    REFRESH_AHEAD = 60
+    LOCK_TTL = 3
+    LOCK_POLL_INTERVAL = 0.025
+
+    def __init__(self, local_size: int, local_ttl: float):
+        # Per-worker copy of the encoded snapshots. Raw bytes are kept rather than User objects,
+        # because an ORM instance can only be attached to one session at a time.
+        self._local = LRUCache(maxsize=local_size, ttl=local_ttl)
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.loads_from_db = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+        self._release_lock = None
+        self._set_if_generation = None
+        invalidation_bus.subscribe("user", self._drop_local)
+
+    def _drop_local(self, email: str | None):
+        if email is None:
+            self._local.clear()
+        else:
+            self._local.pop(email)
+
+    def key(self, email: str) -> str:
+        return f"user:v{self.VERSION}:{email}"
+
+    def lock_key(self, email: str) -> str:
+        return f"user-lock:v{self.VERSION}:{email}"
+
+    def generation_key(self, email: str) -> str:
+        return f"user-gen:v{self.VERSION}:{email}"
+
+    def dumps(self, user: User) -> bytes:
+        """
+        The dumps function serializes the fields of a user needed by authenticated requests.
+        The snapshot is a flat JSON array prefixed with the schema version:
+        [version, id, email, username, avatar, role, confirmed].
+
+        :param self: Represent the instance of the class
+        :param user: User: The user to serialize
+        :return: The encoded snapshot
+        :doc-author: Trelent
+        """
+        role = user.role.value if user.role else None
+        snapshot = [self.VERSION, user.id, user.email, user.username, user.avatar, role, user.confirmed]
+        return json.dumps(snapshot, separators=(",", ":")).encode()
+
+    def loads(self, raw: bytes) -> User | None:
+        """
+        The loads function rebuilds a detached User from a snapshot produced by dumps.
+        Snapshots written with another schema version are treated as a cache miss.
+
+        :param self: Represent the instance of the class
+        :param raw: bytes: The encoded snapshot
+        :return: A detached user, or None if the snapshot can not be used
+        :doc-author: Trelent
+        """
+        try:
+            version, id, email, username, avatar, role, confirmed = json.loads(raw)
+        except (ValueError, TypeError):
+            return None
+        if version != self.VERSION:
+            return None
+        user = User(id=id, email=email, username=username, avatar=avatar,
+                    role=Role(role) if role else None, confirmed=confirmed)
+        make_transient_to_detached(user)
+        return user
+
+    async def get(self, email: str) -> User | None:
+        """
+        The get function looks the user up in the local cache first and falls back to redis.
+        A redis hit is copied into the local cache, so hot accounts stop generating network round trips.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: A detached user, or None on a miss
+        :doc-author: Trelent
+        """
+        raw = self._local.get(email)
+        if raw is None:
+            raw = await redis_manager.client.get(self.key(email))
+            if raw is None:
+                self.redis_misses += 1
+                return None
+            self.redis_hits += 1
+            self._local.set(email, raw)
+        return self.loads(raw)
+
+    async def generation(self, email: str) -> bytes:
+        return await redis_manager.client.get(self.generation_key(email)) or b"0"
+
+    async def set(self, user: User, generation: bytes) -> bytes:
+        """
+        The set function caches the snapshot of a user loaded from the database, unless the user was invalidated
+        since generation was read: the snapshot may then predate the change and is only returned to the caller.
+        The generation is compared and the snapshot written in one script, so an invalidation can not slip between.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user loaded from the database
+        :param generation: bytes: The generation read before the user was loaded
+        :return: The encoded snapshot
+        :doc-author: Trelent
+        """
+        raw = self.dumps(user)
+        if self._set_if_generation is None:
+            self._set_if_generation = redis_manager.client.register_script(SET_IF_GENERATION_SCRIPT)
+        if await self._set_if_generation(keys=[self.key(user.email), self.generation_key(user.email)],
+                                         args=[raw, self.TTL, generation]):
+            self._local.set(user.email, raw)
+        return raw
+
+    async def get_or_load(self, email: str, load: Callable[[AsyncSession], Awaitable[User | None]],
+                          db: AsyncSession) -> User | None:
+        """
+        The get_or_load function returns the cached user or loads it from the database exactly once.
+        Concurrent misses for the same email are coalesced: inside the worker they await one in-flight load,
+        across workers a short redis lock lets one loader query the database while the others wait for its result.
+        Entries that are about to expire are served as they are and refreshed in the background,
+        so hot keys never hit a cold miss.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :param load: Callable[[AsyncSession], Awaitable[User | None]]: Loads the user with the given session
+        :param db: AsyncSession: The session of the current request, used when this request is the loader
+        :return: The user, or None if it does not exist
+        :doc-author: Trelent
+        """
+        raw = self._local.get(email)
+        if raw is not None:
+            return self.loads(raw)
+        async with redis_manager.client.pipeline(transaction=False) as pipe:
+            pipe.get(self.key(email))
+            pipe.ttl(self.key(email))
+            raw, ttl = await pipe.execute()
+        if raw is not None:
+            self.redis_hits += 1
+            self._local.set(email, raw)
+            if 0 <= ttl < self.REFRESH_AHEAD and email not in self._inflight:
+                task = asyncio.create_task(self._single_flight(email, self._load_in_own_session(load)))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return self.loads(raw)
+        self.redis_misses += 1
+
+        if email in self._inflight:
+            raw = await asyncio.shield(self._inflight[email])
+            return None if raw is None else self.loads(raw)
+        loaded: list[User | None] = []
+
+        async def load_with_request_session():
+            user = await load(db)
+            loaded.append(user)
+            return user
+
+        raw = await self._single_flight(email, load_with_request_session)
+        if loaded:
+            # This request was the loader: hand back its own attached instance.
+            return loaded[0]
+        return None if raw is None else self.loads(raw)
+
+    def _load_in_own_session(self, load: Callable[[AsyncSession], Awaitable[User | None]]):
+        async def load_with_own_session():
+            async with sessionmanager.session() as session:
+                return await load(session)
+        return load_with_own_session
+
+    async def _single_flight(self, email: str, load: Callable[[], Awaitable[User | None]]) -> bytes | None:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[email] = future
+        try:
+            raw = await self._load_locked(email, load)
+            future.set_result(raw)
+            return raw
+        except Exception as err:
+            future.set_exception(err)
+            # Mark the exception as retrieved when nobody else was waiting for this load.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[email]
+
+    async def _load_locked(self, email: str, load: Callable[[], Awaitable[User | None]]) -> bytes | None:
+        client = redis_manager.client
+        owner = uuid.uuid4().hex
+        if not await client.set(self.lock_key(email), owner, nx=True, ex=self.LOCK_TTL):
+            # Another worker is loading this user: wait for its result, then fall back to loading ourselves.
+            for _ in range(int(self.LOCK_TTL / self.LOCK_POLL_INTERVAL)):
+                await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+                raw = await client.get(self.key(email))
+                if raw is not None:
+                    self._local.set(email, raw)
+                    return raw
+        try:
+            self.loads_from_db += 1
+            generation = await self.generation(email)
+            user = await load()
+            return None if user is None else await self.set(user, generation)
+        finally:
+            if self._release_lock is None:
+                self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+            await self._release_lock(keys=[self.lock_key(email)], args=[owner])
+
+    async def invalidate(self, email: str):
+        """
+        The invalidate function drops the cached snapshot of a user in redis and in every worker.
+        It is called by the users repository after every change of a cached field. It also bumps the generation
+        of the user, so a load that read the database before the change can not cache its snapshot afterwards.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the changed user
+        :return: Nothing
+        :doc-author: Trelent
+        """
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.incr(self.generation_key(email))
+            # Outlives any load that could have read the generation before this bump.
+            pipe.expire(self.generation_key(email), self.TTL)
+            pipe.delete(self.key(email))
+            await pipe.execute()
+        await invalidation_bus.publish("user", email)
+
+    def stats(self) -> dict:
+        return {"local": self._local.stats(), "redis": {"hits": self.redis_hits, "misses": self.redis_misses},
+                "loads_from_db": self.loads_from_db}
+
+
+user_cache = UserCache(config.USER_CACHE_LOCAL_SIZE, config.USER_CACHE_LOCAL_TTL)
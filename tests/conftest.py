@@ -6,6 +6,7 @@ from sqlalchemy.orm import sessionmaker
 from main import app
 from src.entity.models import Base
 from src.database.db import get_db
+from src.services.read_db import get_read_db
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -41,6 +42,7 @@ def client(session):
             session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     yield TestClient(app)
 
@@ -0,0 +1,12 @@
+import redis.asyncio as redis
+
+from src.database.cache import RedisManager
+
+
+def test_pool_waits_for_a_free_connection():
+    manager = RedisManager("localhost", 6379, None, max_connections=7, timeout=2.5)
+    pool = manager.init().connection_pool
+    assert isinstance(pool, redis.BlockingConnectionPool)
+    assert pool.max_connections == 7
+    assert pool.timeout == 2.5
+    assert manager.init() is manager.client
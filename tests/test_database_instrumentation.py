@@ -0,0 +1,78 @@
+import json
+import logging
+from datetime import date
+
+from sqlalchemy import create_engine, event, text
+
+from src.conf.config import config
+from src.database import instrumentation
+from src.database.instrumentation import RequestStats, redact, request_stats
+
+
+class Route:
+    path = "/api/contacts/{contact_id}"
+
+
+def make_engine():
+    engine = create_engine("sqlite://")
+    event.listen(engine, "before_cursor_execute", instrumentation.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", instrumentation.after_cursor_execute)
+    return engine
+
+
+def test_redact_keeps_numbers_and_hides_text():
+    params = {"id": 7, "limit": 10, "flag": True, "missing": None,
+              "email": "user@example.com", "birth_date": date(2000, 1, 1), "rows": [1, "secret"]}
+    assert redact(params) == {"id": 7, "limit": 10, "flag": True, "missing": None,
+                              "email": "<str:16>", "birth_date": "<date>", "rows": [1, "<str:6>"]}
+
+
+def test_route_uses_the_path_template():
+    stats = RequestStats({"method": "GET", "path": "/api/contacts/5", "route": Route()})
+    assert stats.route == "GET /api/contacts/{contact_id}"
+    assert RequestStats({"method": "GET", "path": "/missing"}).route == "GET /missing"
+    assert RequestStats().route is None
+
+
+def test_queries_are_recorded_in_the_request_stats():
+    engine = make_engine()
+    stats = RequestStats({"method": "GET", "path": "/"})
+    token = request_stats.set(stats)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT :value"), {"value": 2})
+    finally:
+        request_stats.reset(token)
+    assert stats.queries == 2
+    assert stats.db_time >= stats.slowest_time > 0
+    assert stats.slowest_statement in ("SELECT 1", "SELECT ?")
+    assert stats.server_timing().startswith('db;dur=')
+    assert 'desc="2 queries"' in stats.server_timing()
+
+
+def test_repeated_statement_warns_once(caplog, monkeypatch):
+    monkeypatch.setattr(config, "SQL_REPEATED_QUERY_THRESHOLD", 3)
+    stats = RequestStats({"method": "GET", "path": "/api/contacts/", "route": Route()})
+    with caplog.at_level(logging.WARNING, logger="sql"):
+        for _ in range(6):
+            stats.record("SELECT * FROM users WHERE id = ?", 0.001)
+        stats.record("SELECT 1", 0.001)
+    warnings = [json.loads(record.message) for record in caplog.records]
+    assert len(warnings) == 1
+    assert warnings[0]["event"] == "repeated_query"
+    assert warnings[0]["route"] == "GET /api/contacts/{contact_id}"
+    assert stats.summary(200, 0.01)["repeated"] == {"SELECT * FROM users WHERE id = ?": 6}
+
+
+def test_slow_query_is_logged_with_redacted_parameters(caplog, monkeypatch):
+    monkeypatch.setattr(config, "SQL_SLOW_QUERY_MS", 0)
+    engine = make_engine()
+    with caplog.at_level(logging.WARNING, logger="sql"):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT :email, :id"), {"email": "user@example.com", "id": 3})
+    slow = json.loads(caplog.records[-1].message)
+    assert slow["event"] == "slow_query"
+    assert slow["route"] is None
+    assert slow["parameters"] == ["<str:16>", 3]
+    assert "user@example.com" not in caplog.text
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from src.entity.models import Contact, birthday_key
+from src.repository.contacts import birthday_ranges
+
+
+def test_birthday_key_is_maintained_by_the_model():
+    contact = Contact(first_name="Wade", birth_date=date(1990, 3, 1))
+    assert contact.birthday_key == 301
+    contact.birth_date = date(1990, 12, 31)
+    assert contact.birthday_key == 1231
+    contact.birth_date = None
+    assert contact.birthday_key is None
+
+
+@pytest.mark.parametrize("start, period, expected", [
+    (date(2026, 5, 10), 7, [(510, 517)]),
+    (date(2026, 1, 28), 7, [(128, 204)]),
+    (date(2026, 12, 28), 7, [(1228, 1231), (101, 104)]),
+    (date(2026, 2, 21), 7, [(221, 229)]),
+    (date(2028, 2, 21), 7, [(221, 228)]),
+    (date(2026, 2, 25), 7, [(225, 304)]),
+    (date(2026, 6, 1), 0, [(601, 601)]),
+    (date(2026, 6, 1), 365, [(101, 1231)]),
+])
+def test_birthday_ranges(start, period, expected):
+    assert birthday_ranges(start, period) == expected
+
+
+def test_leap_day_is_inside_a_range_spanning_march():
+    (first, last), = birthday_ranges(date(2026, 2, 25), 7)
+    assert first <= birthday_key(date(2000, 2, 29)) <= last
@@ -0,0 +1,63 @@
+import base64
+import json
+
+import pytest
+from sqlalchemy import select
+
+from src.entity.models import Contact
+from src.repository.contacts import encode_cursor, decode_cursor, paginate, split_page
+
+
+def test_cursor_roundtrip():
+    contact = Contact(id=42, first_name="Wade", email="wade@example.com")
+
+    assert decode_cursor(encode_cursor("id", contact), "id") == (42, 42)
+    assert decode_cursor(encode_cursor("first_name", contact), "first_name") == ("Wade", 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", encode_cursor("email", Contact(id=1, email="a@b.c"))])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor or "e30", "first_name")
+
+
+@pytest.mark.parametrize("sort, value", [("id", "42"), ("id", True), ("id", 4.2), ("first_name", {"a": 1}),
+                                         ("first_name", 5), ("email", None)])
+def test_cursor_value_must_match_the_sort_column(sort, value):
+    raw = json.dumps([sort, value, 42]).encode()
+
+    with pytest.raises(ValueError):
+        decode_cursor(base64.urlsafe_b64encode(raw).decode(), sort)
+
+
+def test_keyset_predicate_replaces_offset():
+    cursor = encode_cursor("first_name", Contact(id=42, first_name="Wade"))
+    sql = str(paginate(select(Contact), limit=10, offset=100, cursor=cursor, sort="first_name"))
+
+    assert "(contacts.first_name, contacts.id) >" in sql
+    assert "ORDER BY contacts.first_name, contacts.id" in sql
+    assert "OFFSET" not in sql
+
+
+def test_offset_mode_without_cursor():
+    sql = str(paginate(select(Contact), limit=10, offset=100, cursor=None, sort="id"))
+
+    assert "ORDER BY contacts.id" in sql
+    assert "OFFSET" in sql
+
+
+def test_keyset_fetches_one_extra_row():
+    sql = str(paginate(select(Contact), limit=10, offset=0, cursor=None, sort="id").compile(
+        compile_kwargs={"literal_binds": True}))
+
+    assert "LIMIT 11" in sql
+
+
+def test_split_page_cursor_only_before_the_last_page():
+    contacts = [Contact(id=i, first_name=f"n{i}") for i in range(1, 12)]
+
+    page, cursor = split_page(contacts, 10, "id")
+    assert page == contacts[:10]
+    assert decode_cursor(cursor, "id") == (10, 10)
+    assert split_page(contacts[:10], 10, "id") == (contacts[:10], None)
+    assert split_page(contacts[:3], 10, "id") == (contacts[:3], None)
@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+pytest.importorskip("aiosqlite")
+
+from src.entity.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas.contact import ContactModel, ContactResponse, ContactUpdateModel
+
+HOOKS = ("autocomplete_index", "contact_counter", "contact_versions", "sessionmanager")
+
+
+def run(scenario):
+    """
+    The run function runs the scenario against a fresh in-memory database with the user attached to the
+    session, the way get_current_user hands it over on a user cache miss: every commit expires it.
+    The redis backed hooks are replaced by mocks, which the scenario gets to check the calls.
+    """
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine)
+        async with session_maker() as db:
+            db.add(User(username="john", email="john@example.com", password="-", avatar="http://avatar"))
+            await db.commit()
+            user = (await db.execute(select(User))).scalar_one()
+            hooks = {name: AsyncMock() for name in HOOKS}
+            with patch.multiple(repository_contacts, **hooks):
+                result = await scenario(db, user, hooks)
+        await engine.dispose()
+        return result
+    return asyncio.run(main())
+
+
+def contact_body(first_name="John", email="john.doe@example.com", phone_number="555-0100"):
+    return ContactModel(first_name=first_name, last_name="Doe", email=email, phone_number=phone_number,
+                        additional_data="")
+
+
+async def rows(*items):
+    for item in items:
+        yield item
+
+
+def test_update_contact_with_user_expired_by_commit():
+    async def scenario(db, user, hooks):
+        contact = await repository_contacts.create_contact(contact_body(), db, user)
+        updated = await repository_contacts.update_contact(contact.id, ContactUpdateModel(first_name="Z"), db, user,
+                                                           partial=True)
+        return ContactResponse.model_validate(updated), hooks, user.id
+
+    response, hooks, user_id = run(scenario)
+    assert response.first_name == "Z"
+    assert response.user.username == "john"
+    assert hooks["contact_versions"].bump.await_count == 2
+    hooks["contact_versions"].bump.assert_awaited_with(user_id)
+    hooks["sessionmanager"].mark_write.assert_awaited_with(user_id)
+
+
+def test_delete_contact_with_user_expired_by_commit():
+    async def scenario(db, user, hooks):
+        contact = await repository_contacts.create_contact(contact_body(), db, user)
+        deleted = await repository_contacts.delete_contact(contact.id, db, user)
+        remaining = (await db.execute(select(Contact))).scalars().all()
+        return deleted, remaining, hooks
+
+    deleted, remaining, hooks = run(scenario)
+    assert deleted is not None and remaining == []
+    hooks["contact_counter"].changed.assert_awaited_with(1, -1)
+    assert hooks["contact_versions"].bump.await_count == 2
+
+
+def test_upsert_contacts_in_batches_with_user_expired_by_commit():
+    async def scenario(db, user, hooks):
+        items = rows(*({"first_name": f"n{i}", "last_name": "x", "email": f"n{i}@example.com", "phone_number": "1",
+                        "additional_data": ""} for i in range(5)))
+        batches = [batch async for batch in repository_contacts.upsert_contacts_in_batches(items, db, user, 2)]
+        count = len((await db.execute(select(Contact))).scalars().all())
+        return batches, count, hooks
+
+    batches, count, hooks = run(scenario)
+    assert count == 5
+    assert [result["row"] for batch in batches for result in batch] == [0, 1, 2, 3, 4]
+    hooks["contact_versions"].bump.assert_awaited_once_with(1)
+    hooks["contact_counter"].invalidate.assert_awaited_once_with(1)
+
+
+def test_search_contacts_uses_sqlite_fts():
+    async def scenario(db, user, hooks):
+        for first_name, email, phone in (("John", "john.doe@example.com", "555-0100"),
+                                         ("Johnny", "johnny@example.com", "555-0200"),
+                                         ("Mary", "mary@example.com", "+380 123 45 67")):
+            await repository_contacts.create_contact(contact_body(first_name, email, phone), db, user)
+        by_name = await repository_contacts.search_contacts("joh", 10, db, user)
+        by_phone = await repository_contacts.search_contacts("123", 10, db, user)
+        return [c.first_name for c in by_name], [c.first_name for c in by_phone]
+
+    by_name, by_phone = run(scenario)
+    assert sorted(by_name) == ["John", "Johnny"]
+    assert by_phone == ["Mary"]
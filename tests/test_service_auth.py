@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from jose import JWTError
+
+from src.entity.models import Role, User
+from src.services.auth import auth_service, Principal
+
+
+def test_decode_token_is_cached_until_exp():
+    auth_service.token_cache.clear()
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "deadpool@example.com"}, expires_delta=60))
+
+    payload = auth_service.decode_token(token)
+    assert payload["sub"] == "deadpool@example.com"
+    assert payload["scope"] == "access_token"
+    assert auth_service.decode_token(token) is payload
+    assert len(auth_service.token_cache) == 1
+
+
+def test_decode_token_does_not_cache_invalid_tokens():
+    auth_service.token_cache.clear()
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "deadpool@example.com"}))
+
+    with pytest.raises(JWTError):
+        auth_service.decode_token(token[:-2] + "xx")
+    assert len(auth_service.token_cache) == 0
+
+
+def test_principal_from_claims_token_without_io():
+    user = User(id=3, email="deadpool@example.com", username="deadpool", role=Role.moderator, confirmed=True)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}, user=user))
+
+    principal = asyncio.run(auth_service.get_principal(token, db=None))
+
+    assert principal == Principal(id=3, email="deadpool@example.com", role=Role.moderator, confirmed=True)
+
+
+def test_revoked_claims_token_is_rejected():
+    user = User(id=4, email="wolverine@example.com", username="wolverine", role=Role.user, confirmed=True)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}, user=user))
+    auth_service._revoke_local(f"4:{int(time.time())}")
+
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(auth_service.get_principal(token, db=None))
+    assert err.value.status_code == 401
+
+
+def test_revocations_are_pruned_only_after_expiry(monkeypatch):
+    monkeypatch.setattr(auth_service, "revoked_users", {})
+    monkeypatch.setattr(auth_service, "_prune_revocations_at", 3)
+    now = int(time.time())
+    auth_service._revoke_local(f"1:{now - auth_service.CLAIMS_TOKEN_TTL - 1}")
+    auth_service._revoke_local(f"2:{now - 1}")
+    auth_service._revoke_local(f"3:{now}")
+
+    assert auth_service.revoked_users == {2: now - 1, 3: now}
+    for user_id in range(4, 10):
+        auth_service._revoke_local(f"{user_id}:{now}")
+    assert len(auth_service.revoked_users) == 8
@@ -0,0 +1,87 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.entity.models import Base, Contact, User
+from src.services.autocomplete import AutocompleteIndex, PrefixIndex, contact_terms
+
+
+def make_index():
+    return PrefixIndex([
+        (1, "John", "Smith", "js@example.com"),
+        (2, "Johanna", "Doe", "jdoe@example.com"),
+        (3, "Bob", "Johnson", "bob@example.com"),
+        (4, "Alice", "Jones", "alice@example.com"),
+    ])
+
+
+def ids(suggestions):
+    return [s["id"] for s in suggestions]
+
+
+def test_contact_terms():
+    assert contact_terms("John", "Smith", "JS@Example.com") == {"john", "smith", "john smith", "js@example.com"}
+    assert contact_terms("John", None, "") == {"john"}
+
+
+def test_prefix_matches_names_and_emails():
+    index = make_index()
+    assert ids(index.search("JOH", 10)) == [2, 1, 3]
+    assert ids(index.search("john s", 10)) == [1]
+    assert ids(index.search("jdoe@", 10)) == [2]
+    assert index.search("zz", 10) == []
+
+
+def test_limit_and_unique_contacts():
+    index = make_index()
+    # "jones" and "js@example.com" both point at their contacts only once.
+    assert ids(index.search("j", 10)) == [2, 1, 3, 4]
+    assert ids(index.search("j", 2)) == [2, 1]
+
+
+def test_incremental_updates():
+    index = make_index()
+    size = len(index)
+    index.add(5, "Joe", "Black", "joe@example.com")
+    assert ids(index.search("joe", 10)) == [5]
+    index.add(5, "Wade", "Wilson", "deadpool@example.com")
+    assert index.search("joe", 10) == []
+    assert index.search("wade", 10) == [{"id": 5, "first_name": "Wade", "last_name": "Wilson",
+                                         "email": "deadpool@example.com"}]
+    index.remove(5)
+    index.remove(5)
+    assert index.search("wade", 10) == []
+    assert len(index) == size
+
+
+def test_concurrent_searches_share_a_build_in_its_own_session():
+    pytest.importorskip("aiosqlite")
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine)
+        async with session_maker() as db:
+            user = User(username="wade", email="wade@example.com", password="-")
+            db.add(Contact(first_name="Wade", last_name="Wilson", email="deadpool@example.com", phone_number="1",
+                           additional_data="", user=user))
+            await db.flush()
+            user_id = user.id
+            await db.commit()
+        index = AutocompleteIndex(max_users=10, ttl=60)
+        with patch("src.services.autocomplete.sessionmanager", MagicMock(pick_session_maker=lambda: session_maker)):
+            first = asyncio.create_task(index.search("wa", 10, user_id))
+            second = asyncio.create_task(index.search("wil", 10, user_id))
+            await asyncio.sleep(0)
+            # The request that started the build goes away: the other one still gets the index.
+            first.cancel()
+            result = await second
+        await engine.dispose()
+        return index.builds, result
+
+    builds, result = asyncio.run(main())
+    assert builds == 1
+    assert ids(result) == [1]
@@ -0,0 +1,22 @@
+import uuid
+
+from src.services.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_false_positive_rate_is_bounded():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for _ in range(1000):
+        bloom.add(uuid.uuid4().hex)
+
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
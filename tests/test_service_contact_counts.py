@@ -0,0 +1,61 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.services.contact_counts import ContactCounter
+
+
+def make_db(count):
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalar_one=MagicMock(return_value=count)))
+    return db
+
+
+def make_redis(cached=None):
+    client = MagicMock()
+    client.get = AsyncMock(return_value=cached)
+    client.set = AsyncMock()
+    return client
+
+
+def test_filtered_key_does_not_depend_on_criteria_order():
+    counter = ContactCounter(cap=100, cache_ttl=30, reconcile_interval=3600)
+    assert counter.filtered_key(1, {"first_name": "a", "email": "b"}) == \
+        counter.filtered_key(1, {"email": "b", "first_name": "a"})
+    assert counter.filtered_key(1, {"first_name": "a"}) != counter.filtered_key(2, {"first_name": "a"})
+    assert not counter.filtered_key(1, {"first_name": "a"}).startswith(counter.key(1))
+
+
+def test_total_uses_counter():
+    counter = ContactCounter(cap=100, cache_ttl=30, reconcile_interval=3600)
+    db, client = make_db(5), make_redis(b"42")
+    with patch("src.services.contact_counts.redis_manager", MagicMock(client=client)):
+        assert asyncio.run(counter.total(db, 1)) == (42, False)
+    db.execute.assert_not_called()
+
+
+def test_total_seeds_missing_counter_without_overwriting():
+    counter = ContactCounter(cap=100, cache_ttl=30, reconcile_interval=3600)
+    db, client = make_db(500), make_redis()
+    with patch("src.services.contact_counts.redis_manager", MagicMock(client=client)):
+        assert asyncio.run(counter.total(db, 1)) == (500, False)
+    client.set.assert_awaited_once_with("contacts:count:1", 500, ex=ContactCounter.TTL, nx=True)
+
+
+def test_filtered_total_is_capped_and_cached():
+    counter = ContactCounter(cap=100, cache_ttl=30, reconcile_interval=3600)
+    db, client = make_db(100), make_redis()
+    with patch("src.services.contact_counts.redis_manager", MagicMock(client=client)):
+        assert asyncio.run(counter.total(db, 1, {"first_name": "a"})) == (100, True)
+    stmt = db.execute.await_args.args[0]
+    assert "LIMIT" in str(stmt)
+    client.set.assert_awaited_once_with(counter.filtered_key(1, {"first_name": "a"}), 100, ex=30)
+
+
+def test_total_all_is_capped_and_cached():
+    counter = ContactCounter(cap=100, cache_ttl=30, reconcile_interval=3600)
+    db, client = make_db(7), make_redis()
+    with patch("src.services.contact_counts.redis_manager", MagicMock(client=client)):
+        assert asyncio.run(counter.total_all(db)) == (7, False)
+    assert "LIMIT" in str(db.execute.await_args.args[0])
+    client.set.assert_awaited_once_with("contacts:count-all", 7, ex=30)
+    assert not "contacts:count-all".startswith(counter.key(""))
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.services.etags import CollectionVersions, contact_etag, etag_matches
+
+
+@pytest.mark.parametrize("header, expected", [('"abc"', True), ('W/"abc"', True), ('"x", "abc"', True), ("*", True),
+                                              ('"x"', False), ("", False), (None, False)])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+def test_contact_etag_changes_with_updated_at():
+    first = contact_etag(1, datetime(2024, 1, 1), datetime(2024, 1, 1))
+    assert first.startswith('"') and first.endswith('"')
+    assert first == contact_etag(1, datetime(2024, 1, 1), datetime(2024, 1, 1))
+    assert first != contact_etag(1, datetime(2024, 1, 2), datetime(2024, 1, 1))
+    assert first != contact_etag(1, datetime(2024, 1, 1), datetime(2024, 1, 2))
+    assert first != contact_etag(2, datetime(2024, 1, 1), datetime(2024, 1, 1))
+
+
+def test_list_etag_is_one_get_and_depends_on_version_and_query():
+    versions = CollectionVersions()
+    client = MagicMock()
+    client.get = AsyncMock(return_value=b"5")
+    with patch("src.services.etags.redis_manager", MagicMock(client=client)):
+        first = asyncio.run(versions.list_etag(1, "/api/contacts/", [("limit", "10")]))
+        assert first == asyncio.run(versions.list_etag(1, "/api/contacts/", [("limit", "10")]))
+        assert first != asyncio.run(versions.list_etag(1, "/api/contacts/", [("limit", "20")]))
+        client.get.return_value = b"6"
+        assert first != asyncio.run(versions.list_etag(1, "/api/contacts/", [("limit", "10")]))
+    assert client.get.await_count == 4
+
+
+def test_missing_version_is_seeded_from_the_clock():
+    versions = CollectionVersions()
+    client = MagicMock()
+    client.get = AsyncMock(return_value=None)
+    client.set = AsyncMock(return_value=True)
+    with patch("src.services.etags.redis_manager", MagicMock(client=client)):
+        version = asyncio.run(versions.get(1))
+    assert version > 10 ** 18
+    client.set.assert_awaited_once_with("contacts:version:1", version, ex=CollectionVersions.TTL, nx=True)
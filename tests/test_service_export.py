@@ -0,0 +1,55 @@
+import asyncio
+from datetime import date, datetime
+
+from src.entity.models import Contact
+from src.services.export import export_chunks, to_vcard, vcard_fold
+
+
+def make_contact(**fields):
+    values = dict(id=7, first_name="Wade", last_name="Wilson", email="wade@example.com", phone_number="+380501234567",
+                  birth_date=date(1990, 3, 1), additional_data="", created_at=datetime(2024, 1, 2, 3, 4, 5),
+                  updated_at=datetime(2024, 1, 2, 3, 4, 5))
+    values.update(fields)
+    return Contact(**values)
+
+
+async def aiter_list(items):
+    for item in items:
+        yield item
+
+
+def export(contacts, fmt):
+    async def collect():
+        return [chunk async for chunk in export_chunks(aiter_list(contacts), fmt)]
+    return asyncio.run(collect())
+
+
+def test_csv_header_and_first_row_are_sent_first():
+    chunks = export([make_contact(), make_contact(id=8), make_contact(id=9)], "csv")
+    assert chunks[0].startswith(b"id,first_name,last_name,")
+    assert chunks[1].startswith(b"7,Wade,Wilson,")
+    assert b"".join(chunks).count(b"\r\n") == 4
+
+
+def test_ndjson_row():
+    chunk, = export([make_contact(birth_date=None)], "ndjson")
+    assert chunk == (b'{"id": 7, "first_name": "Wade", "last_name": "Wilson", "email": "wade@example.com", '
+                     b'"phone_number": "+380501234567", "birth_date": null, "additional_data": "", '
+                     b'"created_at": "2024-01-02T03:04:05", "updated_at": "2024-01-02T03:04:05"}\n')
+
+
+def test_vcard_escapes_values():
+    card = to_vcard(make_contact(last_name="Wilson, Jr;", additional_data="a\nb"))
+    assert "N:Wilson\\, Jr\\;;Wade;;;\r\n" in card
+    assert "NOTE:a\\nb\r\n" in card
+    assert "BDAY:1990-03-01\r\n" in card
+    assert card.startswith("BEGIN:VCARD\r\n") and card.endswith("END:VCARD\r\n")
+
+
+def test_vcard_fold_keeps_lines_within_75_octets():
+    folded = vcard_fold("NOTE:" + "Дедпул" * 20)
+    lines = folded.split("\r\n")[:-1]
+    assert len(lines) > 1
+    assert all(len(line.encode()) <= 75 for line in lines)
+    assert all(line.startswith(" ") for line in lines[1:])
+    assert "".join(line[1:] if i else line for i, line in enumerate(lines)) == "NOTE:" + "Дедпул" * 20
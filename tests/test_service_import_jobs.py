@@ -0,0 +1,46 @@
+import io
+from datetime import date
+
+import pytest
+
+from src.entity.models import Contact
+from src.services.export import to_vcard
+from src.services.import_jobs import csv_rows, import_format, vcard_birthday, vcard_rows
+
+
+@pytest.mark.parametrize("filename, fmt", [("book.CSV", "csv"), ("book.vcf", "vcf"), ("a.vcard", "vcf"),
+                                           ("a.ndjson", "json"), ("a.txt", None), (None, None)])
+def test_import_format(filename, fmt):
+    assert import_format(filename) == fmt
+
+
+def test_csv_rows_keep_contact_fields_only():
+    data = 'first_name,last_name,email,phone_number,birth_date,additional_data,id\nA,B,a@x.com,1,,"x,\ny",7\n'
+    assert list(csv_rows(io.StringIO(data, newline=""))) == [
+        {"first_name": "A", "last_name": "B", "email": "a@x.com", "phone_number": "1", "additional_data": "x,\ny"}]
+
+
+@pytest.mark.parametrize("value, expected", [("1990-03-01", "1990-03-01"), ("19900301", "1990-03-01"),
+                                             ("1990-03-01T00:00:00Z", "1990-03-01"), ("--0301", None)])
+def test_vcard_birthday(value, expected):
+    assert vcard_birthday(value) == expected
+
+
+def test_vcard_rows_read_folded_and_escaped_values():
+    data = ("BEGIN:VCARD\r\nVERSION:3.0\r\nN:Wilson\\, Jr;Wade;;;\r\nitem1.EMAIL;TYPE=INTERNET:wade@x.com\r\n"
+            "EMAIL:other@x.com\r\nTEL;TYPE=CELL:+380\r\n 501\r\nNOTE:a\\nb\r\nEND:VCARD\r\n"
+            "BEGIN:VCARD\r\nFN:Peter\r\nBDAY:--0301\r\nEND:VCARD\r\n")
+    assert list(vcard_rows(io.StringIO(data))) == [
+        {"first_name": "Wade", "last_name": "Wilson, Jr", "email": "wade@x.com", "phone_number": "+380501",
+         "additional_data": "a\nb"},
+        {"first_name": "Peter", "last_name": "", "phone_number": "", "additional_data": "", "birth_date": None},
+    ]
+
+
+def test_exported_vcard_is_imported_back():
+    contact = Contact(id=7, first_name="Wade", last_name="Wilson; Jr", email="wade@example.com",
+                      phone_number="+380501234567", birth_date=date(1990, 3, 1),
+                      additional_data="note, with\nlines " + "x" * 100)
+    row, = vcard_rows(io.StringIO(to_vcard(contact)))
+    assert row == {"first_name": "Wade", "last_name": "Wilson; Jr", "email": "wade@example.com",
+                   "phone_number": "+380501234567", "birth_date": "1990-03-01", "additional_data": contact.additional_data}
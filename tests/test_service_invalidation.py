@@ -0,0 +1,30 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.services.invalidation import InvalidationBus
+
+
+def test_listen_drops_local_entries_on_every_subscribe():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def main():
+        client = fakeredis.aioredis.FakeRedis()
+        bus, seen = InvalidationBus(), []
+        bus.subscribe("user", seen.append)
+        with patch("src.services.invalidation.redis_manager", MagicMock(client=client)):
+            bus.start()
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if seen:
+                    break
+            await client.publish(InvalidationBus.CHANNEL, "user:wade@example.com")
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if len(seen) > 1:
+                    break
+            await bus.stop()
+        return seen
+
+    assert asyncio.run(main()) == [None, "wade@example.com"]
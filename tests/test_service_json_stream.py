@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import pytest
+
+from src.services.json_stream import JSONStreamError, iter_json_items
+
+ROWS = [{"first_name": "Wade", "email": "wade@example.com", "n": 1}, {"first_name": "Пітер", "n": 2.5}, [1, 2], 12345]
+
+
+async def chunked(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def parse(body: bytes, size: int) -> list:
+    async def collect():
+        return [item async for item in iter_json_items(chunked(body, size))]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_array_split_at_any_byte(size):
+    body = b"  \n" + json.dumps(ROWS, ensure_ascii=False).encode() + b"\n"
+    assert parse(body, size) == ROWS
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_ndjson_split_at_any_byte(size):
+    body = "\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS).encode()
+    assert parse(body + b"\n\n", size) == ROWS
+    assert parse(body, size) == ROWS
+
+
+def test_malformed_ndjson_line_is_yielded_and_parsing_continues():
+    items = parse(b'{"n": 1}\n{oops\n{"n": 2}\n', 4)
+    assert items[0] == {"n": 1} and items[2] == {"n": 2}
+    assert isinstance(items[1], JSONStreamError)
+
+
+@pytest.mark.parametrize("body", [b'[{"n": 1} {"n": 2}]', b'[{"n": 1},', b'[{"n": 1}] x', b'[{"n": 1}, oops]'])
+def test_malformed_array_raises(body):
+    with pytest.raises(JSONStreamError):
+        parse(body, 3)
+
+
+def test_empty_bodies():
+    assert parse(b"", 10) == []
+    assert parse(b"[ ]", 1) == []
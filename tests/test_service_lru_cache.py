@@ -0,0 +1,37 @@
+from unittest.mock import patch
+
+from src.services.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+
+def test_entries_expire():
+    cache = LRUCache(maxsize=2, ttl=10)
+    with patch("src.services.lru_cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+    with patch("src.services.lru_cache.time.monotonic", return_value=115.0):
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_pop_and_clear():
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    cache.set("b", 2)
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.services import passwords
+from src.services.passwords import PasswordHasher
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_hash_and_verify_in_executor(executor):
+    hasher = PasswordHasher(executor, workers=1, max_pending=4)
+
+    async def check():
+        hashed = await hasher.run(passwords.hash_password, "123456789")
+        return (await hasher.run(passwords.verify_password, "123456789", hashed),
+                await hasher.run(passwords.verify_password, "password", hashed))
+
+    try:
+        assert asyncio.run(check()) == (True, False)
+    finally:
+        hasher.shutdown()
+
+
+def test_rejects_calls_above_max_pending():
+    hasher = PasswordHasher("thread", workers=1, max_pending=2)
+
+    async def burst():
+        return await asyncio.gather(*(hasher.run(passwords.hash_password, "123456789") for _ in range(4)),
+                                    return_exceptions=True)
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        hasher.shutdown()
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 2
+    assert rejected[0].status_code == 503
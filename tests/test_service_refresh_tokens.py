@@ -0,0 +1,115 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.entity.models import Role, User
+from src.services.refresh_tokens import REUSED, ROTATED, UNKNOWN, RefreshTokenStore
+
+TTL = 7 * 24 * 60 * 60
+
+
+def run_with_redis(scenario):
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def main():
+        manager = MagicMock(client=fakeredis.aioredis.FakeRedis(decode_responses=False))
+        with patch("src.services.refresh_tokens.redis_manager", manager):
+            return await scenario(RefreshTokenStore(), manager.client)
+    return asyncio.run(main())
+
+
+def make_user(role=Role.user):
+    return User(id=7, username="deadpool", email="deadpool@example.com", role=role, confirmed=True)
+
+
+def test_update_claims_reaches_every_family():
+    async def scenario(store, client):
+        first, jti = await store.start(make_user(), "phone", TTL)
+        second, _ = await store.start(make_user(), "laptop", TTL)
+        await store.update_claims(7, Role.admin, True)
+        _, session, _ = await store.rotate(first, jti, TTL)
+        return session, await client.hget(store.family_key(second), "role")
+
+    session, second_role = run_with_redis(scenario)
+    assert session["role"] == "admin"
+    assert int(session["claims_at"]) >= int(time.time()) - 5
+    assert second_role == b"admin"
+
+
+def test_update_claims_does_not_recreate_expired_families():
+    async def scenario(store, client):
+        family, _ = await store.start(make_user(), "phone", TTL)
+        await client.delete(store.family_key(family))
+        await store.update_claims(7, Role.admin, True)
+        return await client.exists(store.family_key(family))
+
+    assert run_with_redis(scenario) == 0
+
+
+def test_rotate_replaces_the_jti():
+    async def scenario(store, client):
+        family, jti = await store.start(make_user(), "phone", TTL)
+        first = await store.rotate(family, jti, TTL)
+        second = await store.rotate(family, first[2], TTL)
+        return jti, first, second
+
+    jti, (status, session, new_jti), (second_status, _, _) = run_with_redis(scenario)
+    assert status == ROTATED and second_status == ROTATED
+    assert new_jti != jti
+    assert session["sub"] == "deadpool@example.com"
+    assert session["uid"] == "7"
+    assert session["role"] == "user"
+    assert session["jti"] == new_jti
+
+
+def test_reused_token_revokes_the_family():
+    async def scenario(store, client):
+        family, jti = await store.start(make_user(), "phone", TTL)
+        other, _ = await store.start(make_user(), "laptop", TTL)
+        await store.rotate(family, jti, TTL)
+        replay = await store.rotate(family, jti, TTL)
+        after = await store.rotate(family, jti, TTL)
+        return family, other, replay, after, await client.exists(store.family_key(family)), await store.sessions(7)
+
+    family, other, (status, session, new_jti), (after_status, _, _), exists, sessions = run_with_redis(scenario)
+    assert status == REUSED
+    assert session == {"uid": "7"}
+    assert new_jti is None
+    assert after_status == UNKNOWN
+    assert exists == 0
+    assert [s["family"] for s in sessions] == [other]
+
+
+def test_unknown_family():
+    async def scenario(store, client):
+        return await store.rotate("missing", "jti", TTL)
+
+    assert run_with_redis(scenario) == (UNKNOWN, {}, None)
+
+
+def test_revoke_ends_the_session():
+    async def scenario(store, client):
+        family, jti = await store.start(make_user(), "phone", TTL)
+        other, _ = await store.start(make_user(), "laptop", TTL)
+        before = await store.sessions(7)
+        await store.revoke(7, family)
+        return family, other, before, await store.sessions(7), await store.rotate(family, jti, TTL)
+
+    family, other, before, after, rotated = run_with_redis(scenario)
+    assert sorted(s["family"] for s in before) == sorted([family, other])
+    assert {s["device"] for s in before} == {"phone", "laptop"}
+    assert [s["family"] for s in after] == [other]
+    assert rotated[0] == UNKNOWN
+
+
+def test_sessions_drop_expired_families_from_the_index():
+    async def scenario(store, client):
+        family, _ = await store.start(make_user(), "phone", TTL)
+        await client.delete(store.family_key(family))
+        return await store.sessions(7), await client.smembers(store.user_key(7))
+
+    sessions, index = run_with_redis(scenario)
+    assert sessions == []
+    assert index == set()
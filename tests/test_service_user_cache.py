@@ -0,0 +1,72 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.entity.models import Role, User
+from src.services.user_cache import UserCache
+
+
+def test_snapshot_roundtrip():
+    cache = UserCache(local_size=10, local_ttl=60)
+    user = User(id=7, username="deadpool", email="deadpool@example.com", password="secret",
+                avatar="https://example.com/a.png", role=Role.moderator, confirmed=True)
+
+    raw = cache.dumps(user)
+    restored = cache.loads(raw)
+
+    assert b"secret" not in raw
+    assert restored.id == 7
+    assert restored.email == user.email
+    assert restored.username == user.username
+    assert restored.avatar == user.avatar
+    assert restored.role == Role.moderator
+    assert restored.confirmed is True
+
+
+def test_snapshot_other_version_is_a_miss():
+    cache = UserCache(local_size=10, local_ttl=60)
+    user = User(id=1, username="deadpool", email="deadpool@example.com", role=Role.user, confirmed=False)
+    raw = cache.dumps(user).replace(b"[1,", b"[0,", 1)
+
+    assert cache.loads(raw) is None
+    assert cache.loads(b"not json") is None
+
+
+def run_with_redis(scenario):
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def main():
+        manager = MagicMock(client=fakeredis.aioredis.FakeRedis())
+        with patch("src.services.user_cache.redis_manager", manager), \
+                patch("src.services.user_cache.invalidation_bus", MagicMock(publish=AsyncMock())):
+            return await scenario(UserCache(local_size=10, local_ttl=60), manager.client)
+    return asyncio.run(main())
+
+
+def test_loaded_user_is_cached():
+    async def scenario(cache, client):
+        user = User(id=1, username="deadpool", email="deadpool@example.com", role=Role.user, confirmed=False)
+        raw = await cache._load_locked(user.email, AsyncMock(return_value=user))
+        return raw, await client.get(cache.key(user.email))
+
+    raw, cached = run_with_redis(scenario)
+    assert cached == raw
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    async def scenario(cache, client):
+        user = User(id=1, username="deadpool", email="deadpool@example.com", role=Role.user, confirmed=False)
+
+        async def load():
+            # The user is read, then changed and invalidated before the loader writes its snapshot.
+            await cache.invalidate(user.email)
+            return user
+
+        raw = await cache._load_locked(user.email, load)
+        return raw, await client.get(cache.key(user.email)), cache._local.get(user.email)
+
+    raw, cached, local = run_with_redis(scenario)
+    assert raw is not None
+    assert cached is None
+    assert local is None